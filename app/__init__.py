@@ -1,5 +1,4 @@
 import logging
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-logger.info("Package 'app' initialized")
\ No newline at end of file
+# entry points (the API server, CLIs) configure logging; importing does not
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,195 @@
+# app/api/cache.py
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+CACHE_ENABLED = os.getenv("CROP_CACHE_ENABLED", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.getenv("CROP_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_MB = float(os.getenv("CROP_CACHE_MAX_MB", "64"))
+# set to a file path (e.g. logs/prediction_cache.sqlite3) to persist across restarts
+CACHE_DB_PATH = os.getenv("CROP_CACHE_DB_PATH") or None
+CACHE_DB_MAX_ROWS = int(os.getenv("CROP_CACHE_DB_MAX_ROWS", "200000"))
+# writes waiting for the SQLite writer thread; beyond this they are skipped
+CACHE_DB_QUEUE_SIZE = int(os.getenv("CROP_CACHE_DB_QUEUE_SIZE", "10000"))
+# rows committed per transaction
+DB_WRITE_BATCH = 256
+
+logger = logging.getLogger(__name__)
+
+_CLEAR = object()  # write-queue marker: empty the table
+
+
+def cache_key(image_bytes, model_version, digest=None):
+    """Content address of an upload for a given model version; `digest` skips rehashing."""
+    return f"{digest or hashlib.sha256(image_bytes).hexdigest()}:{model_version}"
+
+
+class PredictionCache:
+    """
+    LRU cache of full prediction results keyed by `cache_key`.
+    Memory use is bounded by entry count and by the approximate JSON size of
+    the stored results. With `db_path` set, entries are also persisted to
+    SQLite and memory misses fall back to it. Writes go through a queue to a
+    writer thread that commits them in batches, so a request never waits on
+    disk I/O to store its result, and the lock only guards the in-memory LRU.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_mb=CACHE_MAX_MB,
+                 db_path=CACHE_DB_PATH, db_max_rows=CACHE_DB_MAX_ROWS, db_queue_size=CACHE_DB_QUEUE_SIZE):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.db_path = str(db_path) if db_path else None
+        self.db_max_rows = db_max_rows
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()  # one SQLite connection per reading thread
+        self._writes = queue.Queue(maxsize=max(1, int(db_queue_size)))
+        self._db_puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.db_dropped = 0
+        if self.db_path:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            db = self._reader()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            threading.Thread(target=self._write_loop, name="crop-cache-writer", daemon=True).start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _reader(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if self.db_path is None:
+                self.misses += 1
+                return None
+        # WAL readers don't block the writer thread (or each other)
+        row = self._reader().execute("SELECT result FROM predictions WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            result = json.loads(row[0])
+            self._store(key, result, len(row[0]))
+            self.disk_hits += 1
+            return result
+
+    def put(self, key, result):
+        payload = json.dumps(result, separators=(",", ":"))
+        with self._lock:
+            self._store(key, result, len(payload))
+        if self.db_path is not None:
+            try:
+                self._writes.put_nowait((key, payload, time.time()))
+            except queue.Full:
+                # the disk is behind; the entry is still cached in memory
+                with self._lock:
+                    self.db_dropped += 1
+
+    def _write_loop(self):
+        db = self._connect()
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < DB_WRITE_BATCH:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(db, batch)
+            except sqlite3.Error:
+                logger.exception("Could not persist %d cached predictions", len(batch))
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _write(self, db, batch):
+        db.execute("BEGIN")
+        for item in batch:
+            if item is _CLEAR:
+                db.execute("DELETE FROM predictions")
+            else:
+                db.execute("INSERT OR REPLACE INTO predictions (key, result, created) VALUES (?, ?, ?)", item)
+        db.execute("COMMIT")
+        before = self._db_puts
+        self._db_puts += len(batch)
+        if self._db_puts // 1000 != before // 1000:
+            self._prune_db(db)
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        if self.db_path is not None:
+            self._writes.join()
+
+    def _store(self, key, result, size):
+        if self.max_entries == 0 or size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (result, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _prune_db(self, db):
+        # keep only the newest db_max_rows rows
+        db.execute(
+            "DELETE FROM predictions WHERE key IN "
+            "(SELECT key FROM predictions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.db_max_rows,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.db_path is not None:
+            # queued behind pending writes, so none of them survive it
+            self._writes.put(_CLEAR)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "persistent": self.db_path is not None,
+                "pending_writes": self._writes.qsize(),
+                "dropped_writes": self.db_dropped,
+            }
+
+
+prediction_cache = PredictionCache() if CACHE_ENABLED else None
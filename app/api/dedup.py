@@ -0,0 +1,174 @@
+# app/api/dedup.py
+import os
+import random
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# near-duplicate reuse is opt-in: a hit returns another image's prediction
+PHASH_ENABLED = os.getenv("CROP_PHASH_ENABLED", "0") == "1"
+PHASH_THRESHOLD = int(os.getenv("CROP_PHASH_THRESHOLD", "6"))  # max Hamming distance (of 64 bits)
+PHASH_MAX_ENTRIES = int(os.getenv("CROP_PHASH_MAX_ENTRIES", "50000"))
+# fraction of hits that still run the model, to measure false reuse
+PHASH_AUDIT_RATE = float(os.getenv("CROP_PHASH_AUDIT_RATE", "0.05"))
+
+
+def dhash(img, hash_size=8):
+    """
+    64-bit difference hash of a PIL image. Stable under resizing and
+    re-compression, so re-encoded copies of a photo land within a few bits.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = np.asarray(small, dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for Hamming range queries."""
+
+    def __init__(self):
+        self._root = None  # node: [hash, value, {distance: child}]
+        self.size = 0
+
+    def add(self, h, value):
+        if self._root is None:
+            self._root = [h, value, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1] = value
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, value, {}]
+                self.size += 1
+                return
+            node = child
+
+    def nearest(self, h, max_distance):
+        """Return (distance, value) of the closest hash within max_distance, or None."""
+        if self._root is None:
+            return None
+        best = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance and (best is None or d < best[0]):
+                best = (d, node[1])
+                if d == 0:
+                    break
+            # triangle inequality: only children in [d - r, d + r] can match
+            r = best[0] if best is not None else max_distance
+            for cd, child in node[2].items():
+                if d - r <= cd <= d + r:
+                    stack.append(child)
+        return best
+
+
+class NearDuplicateIndex:
+    """
+    Maps perceptual hashes of recently predicted images to their results.
+    The index holds entries for one model version at a time, with one BK-tree
+    per variant of it (crop hint / crop head, see `_variant` in inference.py),
+    and is rebuilt from the newest half of its entries when it outgrows
+    `max_entries`.
+    """
+
+    def __init__(self, threshold=PHASH_THRESHOLD, max_entries=PHASH_MAX_ENTRIES, audit_rate=PHASH_AUDIT_RATE):
+        self.threshold = threshold
+        self.max_entries = max(1, int(max_entries))
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (variant, hash) -> result
+        self._trees = {}  # variant -> BKTree
+        self._version = None
+        self.lookups = 0
+        self.hits = 0
+        self.audits = 0
+        self.false_reuse = 0
+        self.hit_distances = [0] * (threshold + 1)
+        self.false_reuse_distances = [0] * (threshold + 1)
+
+    def lookup(self, h, model_version, variant=None):
+        """Return (distance, result) for the nearest stored image, or None."""
+        with self._lock:
+            self.lookups += 1
+            tree = self._trees.get(variant) if model_version == self._version else None
+            if tree is None:
+                return None
+            found = tree.nearest(h, self.threshold)
+            if found is not None:
+                self.hits += 1
+                self.hit_distances[found[0]] += 1
+            return found
+
+    def should_audit(self):
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def record_audit(self, distance, reused, actual):
+        """Compare a reused result with what the model actually predicted."""
+        with self._lock:
+            self.audits += 1
+            if reused.get("label") != actual.get("label"):
+                self.false_reuse += 1
+                self.false_reuse_distances[distance] += 1
+
+    def add(self, h, model_version, result, variant=None):
+        with self._lock:
+            if model_version != self._version:
+                self._reset(model_version)
+            key = (variant, h)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            tree = self._trees.get(variant)
+            if tree is None:
+                tree = self._trees[variant] = BKTree()
+            tree.add(h, result)
+            if len(self._entries) > self.max_entries:
+                self._compact()
+
+    def _reset(self, model_version):
+        self._version = model_version
+        self._entries.clear()
+        self._trees = {}
+
+    def _compact(self):
+        # BK-trees don't support deletion; rebuild from the newest half
+        keep = list(self._entries.items())[len(self._entries) // 2:]
+        self._entries = OrderedDict(keep)
+        self._trees = {}
+        for (variant, h), result in keep:
+            tree = self._trees.get(variant)
+            if tree is None:
+                tree = self._trees[variant] = BKTree()
+            tree.add(h, result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "variants": len(self._trees),
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "hit_distances": list(self.hit_distances),
+                "audits": self.audits,
+                "false_reuse": self.false_reuse,
+                "false_reuse_rate": round(self.false_reuse / self.audits, 4) if self.audits else 0.0,
+                "false_reuse_distances": list(self.false_reuse_distances),
+            }
+
+
+near_duplicates = NearDuplicateIndex() if PHASH_ENABLED else None
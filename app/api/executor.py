@@ -0,0 +1,81 @@
+# app/api/executor.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# decode + preprocess + model call run here, never on the event loop.
+# Keep workers >= CROP_BATCH_MAX_SIZE so the batcher can fill its batches.
+INFERENCE_WORKERS = int(os.getenv("CROP_INFERENCE_WORKERS", "16"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("CROP_INFERENCE_QUEUE_SIZE", "64"))
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded backlog. At most `max_workers` jobs run and at
+    most `max_queue` more wait for a worker; past that, `submit` fails fast
+    with ExecutorSaturated instead of letting latency grow without bound.
+    """
+
+    def __init__(self, max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_SIZE):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crop-infer")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorSaturated(
+                f"Inference queue full ({self.max_workers} running, {self.max_queue} queued)"
+            )
+        with self._lock:
+            self._pending += 1
+        try:
+            fut = self._pool.submit(self._run, fn, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+        fut.add_done_callback(self._release)
+        return fut
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, _fut=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    @property
+    def queue_depth(self):
+        """Jobs accepted but still waiting for a worker."""
+        with self._lock:
+            return self._pending - self._running
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_queue": self.max_queue,
+                "rejected": self._rejected,
+            }
+
+
+inference_pool = BoundedExecutor()
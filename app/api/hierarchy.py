@@ -0,0 +1,81 @@
+# app/api/hierarchy.py
+"""
+Crop -> disease hierarchy derived from the `Crop___Disease` class names.
+
+Each class belongs to the crop named before the `___`. The hierarchy turns
+one row of model output into a two-stage decision. The crop is the one
+whose classes hold the most probability mass, or the client's hint. The
+disease is the best class of that crop, with its probability renormalized
+within the crop. Class names without `___` each form their own group, so
+the decision is then the same as the flat argmax.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+
+class UnknownCrop(ValueError):
+    """Raised for a crop hint that matches none of the model's crops."""
+
+
+def crop_of(label):
+    return label.split("___", 1)[0]
+
+
+def _key(name):
+    # "Corn_(maize)" -> "corn", "Pepper,_bell" -> "pepper", "Cherry_(including_sour)" -> "cherry"
+    return re.split(r"[(,]", name, 1)[0].replace("_", " ").strip().lower()
+
+
+class CropHierarchy:
+    def __init__(self, class_names):
+        self.class_names = list(class_names)
+        self.crops = list(dict.fromkeys(crop_of(name) for name in self.class_names))
+        index = {crop: i for i, crop in enumerate(self.crops)}
+        # crop index of every class
+        self.group = np.array([index[crop_of(name)] for name in self.class_names], dtype=np.int64)
+        self._aliases = {}
+        for crop in self.crops:
+            self._aliases[crop.lower()] = crop
+            self._aliases.setdefault(_key(crop), crop)
+
+    def resolve(self, hint):
+        """The crop named by a client hint ("tomato", "Corn_(maize)", ...)."""
+        crop = self._aliases.get(hint.strip().lower()) or self._aliases.get(_key(hint))
+        if crop is None:
+            raise UnknownCrop(f"Unknown crop {hint!r}; expected one of: {', '.join(self.crops)}")
+        return crop
+
+    def mask(self, crop):
+        """Boolean mask over the classes, True for `crop`'s."""
+        return self.group == self.crops.index(crop)
+
+    def members(self, crop):
+        """Class indices belonging to `crop`."""
+        return np.flatnonzero(self.mask(crop))
+
+    def decide(self, values, indices, crop=None):
+        """
+        Two-stage decision for one top-k row. Returns (class index, confidence
+        within the crop, crop, crop probability). With `crop` given only that
+        crop's classes are considered. Classes outside the top-k count as 0.
+        """
+        probs = np.zeros(len(self.class_names), dtype=np.float64)
+        probs[np.asarray(indices)] = values
+        mass = np.bincount(self.group, weights=probs, minlength=len(self.crops))
+        g = self.crops.index(crop) if crop is not None else int(np.argmax(mass))
+        within = np.where(self.group == g, probs, -1.0)
+        idx = int(np.argmax(within))
+        confidence = float(probs[idx] / mass[g]) if mass[g] > 0 else 0.0
+        return idx, confidence, self.crops[g], float(mass[g])
+
+
+@lru_cache(maxsize=8)
+def _hierarchy(class_names):
+    return CropHierarchy(class_names)
+
+
+def hierarchy_for(class_names):
+    """The (cached) hierarchy of a model's class list."""
+    return _hierarchy(tuple(class_names))
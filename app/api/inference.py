@@ -1,14 +1,30 @@
 # app/api/inference.py
 import os
-import io
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from contextlib import contextmanager
 from pathlib import Path
-from PIL import Image
 import numpy as np
-import tensorflow as tf
+from PIL import Image
 
-from app.utils.preprocessing import preprocess_image
+from app.utils.image_io import ImageTooLarge, as_file, decode_image
+from app.utils.preprocessing import IMG_SIZE, BatchBuffer, extract_tiles, resize_image, tile_grid
 from app.utils.labels import CLASS_NAMES
-from app.utils.disease_info import DISEASE_INFO
+from app.api.cache import cache_key, prediction_cache
+from app.api.dedup import dhash, near_duplicates
+from app.api.hierarchy import hierarchy_for
+from app.api.metrics import metrics
+from app.api.registry import model_registry
+from app.api.responses import disease_index
+from app.api.runtime import CASCADE_THRESHOLD, CascadeRuntime, KerasRuntime, SubsetRuntime, TFLiteRuntime
+from app.api.timing import LatencyHistogram
+
+logger = logging.getLogger(__name__)
 
 # quiet TF logs
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -27,67 +43,807 @@ def load_model(path=MODEL_PATH):
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"Model file not found at: {p.resolve()}")
+    import tensorflow as tf  # only where a model is actually loaded
     model = tf.keras.models.load_model(str(p))
     return model
 
-# load once on import
-model = load_model()
+def load_runtime(path=MODEL_PATH):
+    """Load a model for serving; `.tflite` files run on the TFLite interpreter."""
+    p = Path(path)
+    if p.suffix == ".tflite":
+        return TFLiteRuntime(p)
+    return KerasRuntime(load_model(p))
+
+def resolve_model(spec):
+    """(path, version, class_names) for a registry version or a model file path."""
+    try:
+        entry = model_registry.get(spec)
+        return entry.path, entry.version, entry.class_names
+    except KeyError:
+        path = Path(spec)
+        if not path.exists():
+            raise
+        return path, model_version(path), CLASS_NAMES
+
+def model_version(path=MODEL_PATH):
+    """Short content hash of the model file; used to key cached predictions."""
+    return f"{Path(path).stem}-{file_digest(path)}"
+
+def file_digest(path):
+    """Short sha256 of a file's content, remembered per (path, size, mtime)."""
+    st = os.stat(path)
+    return _file_digest(str(path), st.st_size, st.st_mtime_ns)
+
+@lru_cache(maxsize=32)
+def _file_digest(path, size, mtime_ns):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+# micro-batching: concurrent requests are coalesced into a single forward pass
+BATCH_MAX_SIZE = int(os.getenv("CROP_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("CROP_BATCH_MAX_WAIT_MS", "10"))
+
+
+class MicroBatcher:
+    """
+    Collects single-image inputs from concurrent callers into one batch.
+    A batch is flushed once it holds `max_batch_size` items or `max_wait_ms`
+    after its first item arrived, whichever comes first. When requests arrive
+    further apart than `max_wait_ms` on average (a moving average of the gap
+    between submissions), waiting would rarely gather a second item, so
+    whatever is queued is flushed right away. `submit` returns a Future that
+    resolves to the caller's own row of the model output (a tuple of rows
+    when the model returns a tuple of arrays). Inputs are copied into one
+    reusable uint8 buffer, so the model receives a (N,H,W,3) uint8 view that
+    is only valid during the call.
+
+    Items submitted with different `predict_fn`s (e.g. the old and new model
+    during a hot swap) are run as separate batches. `submit_many` queues a
+    ready-made batch (e.g. the tiles of one image) that runs as its own
+    forward pass on the same thread.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._buffer = BatchBuffer(self.max_batch_size, dtype=np.uint8)
+        # moving average of the time between submissions; starts "idle"
+        self._gap_cap = max(10 * self.max_wait, 0.001)
+        self._gap = self._gap_cap
+        self._last_arrival = None
+        self._arrival_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="crop-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, inp, predict_fn=None):
+        """Queue one resized image, a (H,W,3) uint8 array from `resize_image`."""
+        fut = Future()
+        self._arrived()
+        self._queue.put((inp, fut, predict_fn or self.predict_fn))
+        return fut
+
+    def _arrived(self):
+        now = time.monotonic()
+        with self._arrival_lock:
+            if self._last_arrival is not None:
+                gap = min(now - self._last_arrival, self._gap_cap)
+                self._gap += 0.2 * (gap - self._gap)
+            self._last_arrival = now
+
+    def submit_many(self, batch, predict_fn=None):
+        """Queue a (N,H,W,3) uint8 batch; the Future resolves to the whole output."""
+        fut = Future()
+        self._queue.put((_Block(batch), fut, predict_fn or self.predict_fn))
+        return fut
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "arrival_gap_ms": round(self._gap * 1000.0, 3),
+        }
+
+    def _collect(self):
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            # sparse traffic: nothing else is likely to arrive in time
+            if self._gap > self.max_wait:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            groups = {}
+            for inp, fut, fn in self._collect():
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                if isinstance(inp, _Block):
+                    self._run_block(fn, inp.batch, fut)
+                else:
+                    groups.setdefault(fn, []).append((inp, fut))
+            for fn, items in groups.items():
+                self._run_batch(fn, items)
+
+    def _run_block(self, predict_fn, batch, fut):
+        try:
+            t0 = time.perf_counter()
+            preds = predict_fn(batch)
+            metrics.observe("forward", (time.perf_counter() - t0) * 1000.0)
+            metrics.batch_sizes.observe(len(batch))
+            fut.set_result(preds)
+        except Exception as e:
+            fut.set_exception(e)
+
+    def _run_batch(self, predict_fn, items):
+        try:
+            batch = self._buffer.fill([inp for inp, _ in items])
+            t0 = time.perf_counter()
+            preds = predict_fn(batch)
+            metrics.observe("forward", (time.perf_counter() - t0) * 1000.0)
+            metrics.batch_sizes.observe(len(items))
+        except Exception as e:
+            for _, fut in items:
+                fut.set_exception(e)
+            return
+        for i, (_, fut) in enumerate(items):
+            if isinstance(preds, tuple):
+                fut.set_result(tuple(p[i] for p in preds))
+            else:
+                fut.set_result(preds[i])
+
+
+class _Block:
+    # marks a whole batch queued through MicroBatcher.submit_many
+    __slots__ = ("batch",)
+
+    def __init__(self, batch):
+        self.batch = batch
+
+
+def _forward(batch):
+    # default predict_fn: whatever model is active when the batch runs
+    if _active is None:
+        raise ModelNotReady("Model is still loading")
+    return _active(batch)
+
+batcher = MicroBatcher(_forward)
+
+# batch sizes traced/allocated before a model is put into service; defaults
+# to the power-of-two sizes the batcher and runtimes pad to
+_default_warmup = ",".join(str(1 << i) for i in range(BATCH_MAX_SIZE.bit_length()) if 1 << i <= BATCH_MAX_SIZE)
+WARMUP_BATCH_SIZES = [int(n) for n in os.getenv("CROP_WARMUP_BATCH_SIZES", _default_warmup).split(",") if n.strip()]
+# how long a hot swap waits for requests still running on the old model
+DRAIN_TIMEOUT_S = float(os.getenv("CROP_DRAIN_TIMEOUT_S", "30"))
+
+
+class ModelNotReady(RuntimeError):
+    """Raised when a prediction is requested before the model has loaded."""
+
+
+class LoadedModel:
+    """
+    A warmed-up runtime together with the version and class list it was
+    loaded with. Requests pin one through `use_model()`, so a hot swap can
+    wait for the requests still running on the old model before dropping it.
+    """
+
+    def __init__(self, runtime, version, class_names, path=None, digest=None):
+        self.runtime = runtime
+        self.version = version
+        self.class_names = list(class_names)
+        self.path = str(path) if path is not None else None
+        # what cached results are keyed by: a registry version can be
+        # re-registered with other weights, so names alone are not enough
+        self.cache_version = version if digest is None or digest in version else f"{version}@{digest}"
+        self.loaded_at = time.time()
+        # forward-pass time per image (batch time amortized over its rows)
+        self.latency = LatencyHistogram()
+        # crop -> LoadedModel of a smaller head for that crop's classes
+        self.heads = {}
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    def for_crop(self, crop):
+        """The model that should score an image of `crop`: its head, if any."""
+        return self.heads.get(crop, self) if crop is not None else self
+
+    def submit(self, inp):
+        """Queue one resized uint8 image for this model; returns a Future."""
+        return batcher.submit(inp, self)
+
+    def submit_many(self, batch):
+        """Queue a (N,H,W,3) uint8 batch as one forward pass; returns a Future."""
+        return batcher.submit_many(batch, self)
+
+    def __call__(self, batch):
+        t0 = time.perf_counter()
+        out = self.runtime(batch)
+        self.latency.observe((time.perf_counter() - t0) * 1000.0 / max(1, len(batch)), len(batch))
+        return out
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    def drain(self, timeout=DRAIN_TIMEOUT_S):
+        """Block until no request holds this model; False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._inflight == 0, timeout)
+
+    def info(self):
+        info = {"version": self.version, "cache_version": self.cache_version,
+                "path": self.path, "runtime": self.runtime.kind,
+                "num_classes": len(self.class_names), "loaded_at": self.loaded_at,
+                "inflight": self._inflight, "latency": self.latency.snapshot()}
+        if isinstance(self.runtime, CascadeRuntime):
+            info["cascade"] = self.runtime.stats()
+        if self.heads:
+            info["crop_heads"] = {crop: {"version": h.version, "latency": h.latency.snapshot()}
+                                  for crop, h in self.heads.items()}
+        return info
+
+
+_active = None
+_swap_lock = threading.Lock()
+# callables(model, inp, result) told about every fresh model result; they
+# run on the request thread, so they must only enqueue work
+_observers = []
+_ready = threading.Event()
+_load_lock = threading.Lock()
+_load_thread = None
+_load_error = None
+_activation_lock = threading.Lock()
+# set in multi-worker front-ends, where another process owns the model
+_remote = None
+_activation = {"version": None, "error": None, "last_swap": None}
+# called with model_status() whenever the active model or activation changes
+_status_listeners = []
+
+
+def warmup(rt, batch_sizes=WARMUP_BATCH_SIZES):
+    """Run dummy batches so graph tracing and tensor allocation happen now."""
+    for n in batch_sizes:
+        rt(np.zeros((n, IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.uint8))
+
+# optional cheap first-stage model (registry version or file) for a cascade;
+# a registry version's metadata {"cascade": {"first", "threshold"}} overrides it
+CASCADE_FIRST = os.getenv("CROP_CASCADE_FIRST")
+
+def _cascade_for(metadata):
+    spec = (metadata or {}).get("cascade")
+    if spec:
+        return spec["first"], float(spec.get("threshold", CASCADE_THRESHOLD))
+    if CASCADE_FIRST:
+        return CASCADE_FIRST, CASCADE_THRESHOLD
+    return None
+
+# optional per-crop heads, "Tomato=v7,Corn=heads/corn.keras"; a registry
+# version's metadata {"crop_heads": {crop: version or path}} overrides it
+CROP_HEADS = os.getenv("CROP_HEADS", "")
+
+def _heads_for(metadata):
+    heads = (metadata or {}).get("crop_heads")
+    if heads:
+        return dict(heads)
+    return dict(item.split("=", 1) for item in CROP_HEADS.split(",") if "=" in item)
+
+def _load_head(crop, spec, version, class_names):
+    path, head_version, head_classes = resolve_model(spec)
+    hierarchy = hierarchy_for(class_names)
+    crop = hierarchy.resolve(crop)
+    members = {class_names[i] for i in hierarchy.members(crop)}
+    if not set(head_classes) <= members:
+        raise ValueError(f"Head {head_version} scores classes outside {crop}")
+    rt = SubsetRuntime(load_runtime(path), [class_names.index(c) for c in head_classes], len(class_names))
+    warmup(rt)
+    return crop, LoadedModel(rt, f"{version}/{crop}:{head_version}", class_names, path, file_digest(path))
+
+def _load(path, version, class_names, cascade=None, heads=None):
+    t0 = time.perf_counter()
+    rt = load_runtime(path)
+    if rt.num_classes != len(class_names):
+        raise ValueError(f"Model {version} has {rt.num_classes} outputs but {len(class_names)} class names")
+    warmup(rt)
+    digest = file_digest(path)
+    if cascade is not None:
+        first_spec, threshold = cascade
+        first_path, first_version, first_classes = resolve_model(first_spec)
+        if list(first_classes) != list(class_names):
+            raise ValueError(f"Cascade model {first_version} has a different class list than {version}")
+        first = load_runtime(first_path)
+        warmup(first)
+        rt = CascadeRuntime(first, rt, threshold)
+        # cascaded answers differ from the big model's; keep their cache keys apart
+        version = f"{version}+{first_version}@{threshold:g}"
+        digest = f"{digest}+{file_digest(first_path)}"
+    m = LoadedModel(rt, version, class_names, path, digest)
+    for crop, spec in (heads or {}).items():
+        crop, head = _load_head(crop, spec, version, m.class_names)
+        m.heads[crop] = head
+    logger.info("Model %s ready in %.1fs (warmed up batch sizes %s, crop heads %s)",
+                version, time.perf_counter() - t0, WARMUP_BATCH_SIZES, sorted(m.heads) or "none")
+    return m
+
+def _swap(new):
+    """Atomically make `new` the active model; returns the previous one."""
+    global _active
+    with _swap_lock:
+        old, _active = _active, new
+    _ready.set()
+    return old
+
+def _initial_model():
+    if _remote is not None:
+        _remote.client.wait_ready()
+        return _remote
+    # an explicit CROP_MODEL_PATH wins; otherwise the registry's active version
+    active = None if env_path else model_registry.active_version()
+    if active:
+        entry = model_registry.get(active)
+        return _load(entry.path, entry.version, entry.class_names,
+                     _cascade_for(entry.metadata), _heads_for(entry.metadata))
+    version = os.getenv("CROP_MODEL_VERSION") or model_version(MODEL_PATH)
+    return _load(MODEL_PATH, version, CLASS_NAMES, _cascade_for(None), _heads_for(None))
+
+def load_serving_model(spec=None):
+    """
+    Load and warm up a model that is not served yet: `spec` is a registry
+    version, or else a model file path versioned by its content hash. With
+    no spec, the model the server would load at startup.
+    """
+    if spec is None:
+        return _initial_model()
+    return _load(*resolve_model(spec))
+
+def _load_and_warmup():
+    global _load_error
+    try:
+        _swap(_initial_model())
+    except Exception as e:
+        _load_error = e
+        logger.exception("Model load failed")
 
-def _get_info_for_label(label):
+def use_remote(model):
     """
-    Try exact match, then case-insensitive match, then fallback to UNKNOWN.
-    Returns a dict with keys 'causes' and 'suggestions'.
+    Serve through `model` (an app.api.ipc.RemoteModel) instead of loading
+    one in this process. Call before start_model_loading.
     """
-    if label in DISEASE_INFO:
-        return DISEASE_INFO[label]
-    # tolerant match
-    label_norm = label.strip().lower()
-    for k, v in DISEASE_INFO.items():
-        if k.strip().lower() == label_norm:
-            return v
-    # fallback
-    return DISEASE_INFO.get("UNKNOWN", {"causes": [], "suggestions": []})
+    global _remote
+    _remote = model
+
+def remote_model():
+    """The RemoteModel set by `use_remote`, or None when the model is local."""
+    return _remote
+
+def start_model_loading():
+    """Load and warm up the model on a background thread (idempotent)."""
+    global _load_thread
+    with _load_lock:
+        if _load_thread is None:
+            _load_thread = threading.Thread(target=_load_and_warmup, name="crop-model-loader", daemon=True)
+            _load_thread.start()
+    return _load_thread
+
+def is_ready():
+    return _ready.is_set()
+
+def wait_until_ready(timeout=None):
+    """Start loading if needed and block until ready; for CLI tools."""
+    start_model_loading().join(timeout)
+    if _load_error is not None:
+        raise _load_error
+    if not is_ready():
+        raise ModelNotReady("Model is still loading")
+
+def readiness():
+    if _ready.is_set():
+        return {"status": "ready", "model_version": _active.version}
+    if _load_error is not None:
+        return {"status": "failed", "error": str(_load_error)}
+    return {"status": "loading"}
+
+def acquire_model():
+    """Pin the active model; pair with release_model (or use `use_model`)."""
+    with _swap_lock:
+        m = _active
+        if m is None:
+            raise ModelNotReady("Model is still loading" if _load_error is None else f"Model failed to load: {_load_error}")
+        with m._idle:
+            m._inflight += 1
+    return m
+
+def release_model(m):
+    with m._idle:
+        m._inflight -= 1
+        if m._inflight == 0:
+            m._idle.notify_all()
+
+@contextmanager
+def use_model():
+    """Pin the active model for the duration of one request."""
+    m = acquire_model()
+    try:
+        yield m
+    finally:
+        release_model(m)
+
+def activate_version(version):
+    """
+    Load a registered version, warm it up, swap it in and drain the old
+    model. Runs synchronously; see start_activation for the background form.
+    """
+    entry = model_registry.get(version)
+    new = _load(entry.path, entry.version, entry.class_names,
+                _cascade_for(entry.metadata), _heads_for(entry.metadata))
+    old = _swap(new)
+    model_registry.set_active(entry.version)
+    _activation["last_swap"] = {"from": old.version if old else None, "to": new.version, "at": time.time()}
+    _status_changed()
+    logger.info("Swapped model %s -> %s", old.version if old else None, new.version)
+    if old is not None and not old.drain(DRAIN_TIMEOUT_S):
+        logger.warning("Model %s still had %d requests in flight after %.0fs",
+                       old.version, old.inflight, DRAIN_TIMEOUT_S)
+    return new
+
+def start_activation(version):
+    """Activate `version` on a background thread; RuntimeError if one is running."""
+    model_registry.get(version)  # fail fast on unknown versions
+    if _remote is not None:
+        # the inference process owns the model; it does the swap
+        _remote.client.activate(version)
+        return
+    if not _activation_lock.acquire(blocking=False):
+        raise RuntimeError(f"Activation of {_activation['version']} already in progress")
+    _activation.update(version=version, error=None)
+    _status_changed()
+
+    def run():
+        try:
+            activate_version(version)
+        except Exception as e:
+            _activation["error"] = f"{version}: {e}"
+            logger.exception("Activation of %s failed", version)
+        finally:
+            _activation["version"] = None
+            _activation_lock.release()
+            _status_changed()
 
-def predict_from_bytes(image_bytes: bytes):
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    inp = preprocess_image(img)  # numpy array shape (1,H,W,C)
-    preds = model.predict(inp)[0]
+    threading.Thread(target=run, name="crop-model-activate", daemon=True).start()
+
+def add_observer(fn):
+    _observers.append(fn)
+
+def remove_observer(fn):
+    if fn in _observers:
+        _observers.remove(fn)
+
+def _notify(m, inp, result):
+    for fn in list(_observers):
+        try:
+            fn(m, inp, result)
+        except Exception:
+            logger.exception("Result observer failed")
+
+def add_status_listener(fn):
+    _status_listeners.append(fn)
+
+def _status_changed():
+    status = model_status()
+    for fn in list(_status_listeners):
+        try:
+            fn(status)
+        except Exception:
+            logger.exception("Status listener failed")
+
+def model_status():
+    if _remote is not None:
+        # pushed by the inference process, which owns the model
+        return _remote.status()
+    return {
+        "active": _active.info() if _active is not None else None,
+        "registry_active": model_registry.active_version(),
+        "activating": _activation["version"],
+        "last_error": _activation["error"],
+        "last_swap": _activation["last_swap"],
+    }
+
+def _decode(image_bytes):
+    # JPEGs are decoded directly near the model's input size
+    with metrics.time("decode"):
+        return decode_image(image_bytes, target_size=IMG_SIZE)
+
+def _preprocess(img):
+    with metrics.time("preprocess"):
+        return resize_image(img)  # uint8 array shape (H,W,C)
+
+def load_input(image_bytes):
+    """Decode and resize one encoded image to the uint8 model input, as /predict does."""
+    return _preprocess(_decode(image_bytes))
+
+def _decode_input(image_bytes):
+    # decode-pool task; failures carry the client-safe message
+    try:
+        return load_input(image_bytes)
+    except Exception as e:
+        raise ValueError(_decode_error(e)) from e
+
+def decode_many(images):
+    """
+    Decode and resize encoded images on the decode pool. Returns one Future
+    per image; a failed one raises ValueError with a message safe to show
+    clients.
+    """
+    return [_decode_pool.submit(_decode_input, b) for b in images]
 
-    # If outputs are logits, apply softmax
-    if not np.isclose(preds.sum(), 1.0):
-        preds = tf.nn.softmax(preds).numpy()
+def _decode_error(e):
+    # PIL's messages name internal objects (<_io.BytesIO object at 0x...>);
+    # clients get a stable message and the details stay in the server log
+    if isinstance(e, ImageTooLarge):
+        return f"Could not decode image: {e}"
+    logger.info("Could not decode image: %r", e)
+    return "Could not decode image: not a supported image"
 
-    idx = int(np.argmax(preds))
-    confidence = float(preds[idx])
+def _cache_lookup(image_bytes, version, digest=None):
+    if prediction_cache is None:
+        return None, None
+    key = cache_key(image_bytes, version, digest)
+    return key, prediction_cache.get(key)
 
-    THRESHOLD = 0.7  # tune as needed
+def _cache_store(key, result):
+    if key is not None:
+        prediction_cache.put(key, result)
 
-    if confidence < THRESHOLD:
-        print(f"[DEBUG] LOW CONF: {confidence} => Unrecognized")
+def resolve_crop(m, hint):
+    """Canonical crop name of a client hint for `m`'s classes; UnknownCrop if none matches."""
+    return hierarchy_for(m.class_names).resolve(hint) if hint else None
+
+def _variant(m, crop):
+    # what cached and near-duplicate results are keyed by: a hint changes the
+    # answer, and a crop head is a model of its own
+    return m.cache_version if crop is None else f"{m.for_crop(crop).cache_version}#{crop}"
+
+def predict_from_bytes(image_bytes: bytes, crop=None, digest=None):
+    """
+    `image_bytes` may also be a buffer (e.g. the mmap of a spilled upload);
+    `digest` is its sha256 hex digest when the caller already computed it.
+    """
+    with use_model() as m:
+        return _predict_one(m, image_bytes, resolve_crop(m, crop), digest)
+
+def _predict_one(m, image_bytes, crop=None, digest=None):
+    version = _variant(m, crop)
+    key, cached = _cache_lookup(image_bytes, version, digest)
+    if cached is not None:
+        return cached
+    img = _decode(image_bytes)
+
+    # optional near-duplicate stage: reuse the prediction of a visually
+    # identical image, except for a sampled fraction kept for auditing
+    phash, reused = None, None
+    if near_duplicates is not None:
+        phash = dhash(img)
+        reused = near_duplicates.lookup(phash, m.cache_version, version)
+        if reused is not None and not near_duplicates.should_audit():
+            _cache_store(key, reused[1])
+            return reused[1]
+
+    inp = _preprocess(img)
+    # blocks until the batch containing this image has been run
+    preds = m.for_crop(crop).submit(inp).result()
+    by = answered_by(preds, m)
+    with metrics.time("postprocess"):
+        result = postprocess(preds, by, crop)
+    if by.cache_version != m.cache_version:
+        # swapped in the inference process meanwhile; `key` names the old model
+        return result
+    _cache_store(key, result)
+    if crop is None:
+        # observers (shadow evaluation) compare unhinted answers only
+        _notify(m, inp, result)
+    if reused is not None:
+        near_duplicates.record_audit(reused[0], reused[1], result)
+    elif phash is not None:
+        near_duplicates.add(phash, m.cache_version, result, version)
+    return result
+
+# PIL releases the GIL while decoding, so batch uploads decode in parallel
+DECODE_WORKERS = int(os.getenv("CROP_DECODE_WORKERS", str(min(8, os.cpu_count() or 1))))
+_decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="crop-decode")
+
+def predict_batch_from_bytes(images, crop=None):
+    """
+    Predict a list of encoded images. Returns one result per input, in input
+    order; an image that fails to decode gets {"error": ...} instead of
+    failing the whole batch. A crop hint applies to every image.
+    """
+    with use_model() as m:
+        return _predict_many(m, images, resolve_crop(m, crop))
+
+def _predict_many(m, images, crop=None):
+    version = _variant(m, crop)
+    target = m.for_crop(crop)
+    lookups = [_cache_lookup(b, version) for b in images]
+    decoded = [
+        None if cached is not None else _decode_pool.submit(_decode_input, b)
+        for b, (_, cached) in zip(images, lookups)
+    ]
+    # queue each image as soon as it is decoded; the batcher groups them
+    pending, inputs = [], []
+    for fut in decoded:
+        inp = None
+        if fut is None:
+            pending.append(None)
+        else:
+            try:
+                inp = fut.result()
+                pending.append(target.submit(inp))
+            except Exception as e:
+                pending.append(e)
+        inputs.append(inp)
+    results = []
+    for (key, cached), item, inp in zip(lookups, pending, inputs):
+        if cached is not None:
+            results.append(cached)
+            continue
+        if isinstance(item, Exception):
+            results.append({"error": str(item)})
+            continue
+        try:
+            preds = item.result()
+        except Exception as e:
+            results.append({"error": str(e)})
+            continue
+        by = answered_by(preds, m)
+        with metrics.time("postprocess"):
+            result = postprocess(preds, by, crop)
+        if by.cache_version == m.cache_version:
+            _cache_store(key, result)
+            if crop is None:
+                _notify(m, inp, result)
+        results.append(result)
+    return results
+
+def answered_by(preds, m):
+    """
+    The model whose output `preds` is. That is `m`, except in multi-worker
+    front-ends where the inference process may have swapped models while
+    the image was in flight (see app.api.ipc.Answer).
+    """
+    return getattr(preds, "model", m)
+
+THRESHOLD = 0.7  # tune as needed
+# pick the crop first, then the disease within it (see app/api/hierarchy.py)
+HIERARCHICAL = os.getenv("CROP_HIERARCHICAL", "1") == "1"
+# with a crop hint, the model must still put at least this much probability on
+# that crop; otherwise renormalizing inside the crop makes anything look confident
+HINT_MIN_CROP_MASS = float(os.getenv("CROP_HINT_MIN_CROP_MASS", "0.2"))
+
+def postprocess(preds, m, crop=None):
+    """
+    Result dict for one image's top-k (values, indices) row from model `m`,
+    restricted to `crop` (a canonical crop name) when given.
+    """
+    # top-k rows from the serving graph, best first (softmax already applied)
+    values, indices = preds
+    hinted = crop is not None
+    if HIERARCHICAL or hinted:
+        idx, confidence, crop, crop_confidence = hierarchy_for(m.class_names).decide(values, indices, crop)
+    else:
+        idx, confidence, crop_confidence = int(indices[0]), float(values[0]), None
+    # without a hint the crop itself must be confident too; a hinted crop
+    # needs enough mass that the image plausibly shows it at all
+    min_mass = HINT_MIN_CROP_MASS if hinted else THRESHOLD
+    crop_ok = crop_confidence is None or crop_confidence >= min_mass
+
+    if confidence < THRESHOLD or not crop_ok:
+        logger.debug("prediction label=Unrecognized confidence=%.4f version=%s", confidence, m.version)
         return {
             "label": "Unrecognized",
             "confidence": round(confidence, 4),
-            "causes": [],
-            "suggestions": [],
-            "_matched_info": {},
+            "crop": crop if hinted else None,
+            "crop_confidence": round(crop_confidence, 4) if crop_confidence is not None else None,
+            "causes": disease_index.empty.causes,
+            "suggestions": disease_index.empty.suggestions,
+            "model_version": m.version,
     }
 
-    label = CLASS_NAMES[idx] if idx < len(CLASS_NAMES) else str(idx)
-
-    info = _get_info_for_label(label)
+    label = m.class_names[idx] if idx < len(m.class_names) else str(idx)
 
-    # Defensive: ensure keys exist and are lists
-    causes = info.get("causes") or []
-    suggestions = info.get("suggestions") or []
+    # shared, pre-serialized tuples from the compiled index (see app/api/responses.py)
+    info = disease_index.get(label)
+    causes = info.causes
+    suggestions = info.suggestions
 
-    # Debug print (server console)
-    print(f"[DEBUG] label={label}, confidence={confidence}, causes_len={len(causes)}, suggestions_len={len(suggestions)}")
+    # formatted only when DEBUG logging is on (CROP_LOG_LEVEL=DEBUG)
+    logger.debug("prediction label=%s confidence=%.4f causes=%d suggestions=%d version=%s",
+                 label, confidence, len(causes), len(suggestions), m.version)
 
     return {
         "label": label,
         "confidence": round(confidence, 4),
+        "crop": crop,
+        "crop_confidence": round(crop_confidence, 4) if crop_confidence is not None else None,
         "causes": causes,
         "suggestions": suggestions,
-        # include matched info for debugging (optional)
-        "_matched_info": info
+        "model_version": m.version,
+    }
+
+# tiled mode: overlapping model-sized tiles instead of one squashed image
+TILE_OVERLAP = float(os.getenv("CROP_TILE_OVERLAP", "0.25"))
+TILE_MAX_TILES = int(os.getenv("CROP_TILE_MAX_TILES", "64"))
+
+def predict_tiled_from_bytes(image_bytes: bytes, overlap=TILE_OVERLAP, max_tiles=TILE_MAX_TILES, crop=None):
+    with use_model() as m:
+        return _predict_tiled(m, image_bytes, overlap, min(max_tiles, TILE_MAX_TILES), resolve_crop(m, crop))
+
+def _predict_tiled(m, image_bytes, overlap, max_tiles, crop=None):
+    """
+    Split a large image into overlapping IMG_SIZE tiles and run them as one
+    forward pass. A disease seen confidently on any tile wins; otherwise the
+    tile probabilities are averaged. `heatmap` holds each tile's strongest
+    disease probability (rows x cols).
+    """
+    tile = IMG_SIZE[0]
+    with Image.open(as_file(image_bytes)) as probe:
+        width, height = probe.size
+    # draft-decode no smaller than the grid needs, whatever the EXIF rotation
+    _, _, _, tw, th = tile_grid(width, height, tile, overlap, max_tiles)
+    with metrics.time("decode"):
+        img = decode_image(image_bytes, target_size=(min(tw, th),) * 2)
+    with metrics.time("preprocess"):
+        cols, rows, stride, tw, th = tile_grid(img.width, img.height, tile, overlap, max_tiles)
+        pixels = np.asarray(img.resize((tw, th)), dtype=np.uint8)
+        batch = extract_tiles(pixels, stride, tile).reshape(-1, tile, tile, 3)  # the only copy
+
+    out = m.for_crop(crop).submit_many(batch).result()
+    m = answered_by(out, m)
+    values, indices = out
+    probs = np.zeros((len(batch), len(m.class_names)), dtype=np.float32)
+    np.put_along_axis(probs, indices, values, axis=1)
+    disease = np.array(["healthy" not in name.lower() for name in m.class_names])
+    if crop is not None:
+        disease &= hierarchy_for(m.class_names).mask(crop)
+    tile_disease = probs[:, disease].max(axis=1) if disease.any() else np.zeros(len(batch))
+
+    best = int(np.argmax(tile_disease))
+    if tile_disease[best] >= THRESHOLD:
+        preds, source = (values[best], indices[best]), "tile"
+    else:
+        mean = probs.mean(axis=0)
+        top = np.argsort(mean)[::-1][:indices.shape[1]]
+        preds, source = (mean[top], top), "mean"
+    result = postprocess(preds, m, crop)
+    r, c = divmod(best, cols)
+    result["tiles"] = {
+        "rows": rows,
+        "cols": cols,
+        "count": len(batch),
+        "tile_size": tile,
+        "stride": stride,
+        "source": source,
+        # strongest disease tile as fractions of the image [x0, y0, x1, y1]
+        "hotspot": [round(c * stride / tw, 4), round(r * stride / th, 4),
+                    round((c * stride + tile) / tw, 4), round((r * stride + tile) / th, 4)],
     }
+    # float64 first: rounded float32 values print as 0.12300000339746475
+    result["heatmap"] = np.round(tile_disease.astype(float).reshape(rows, cols), 3).tolist()
+    return result
@@ -0,0 +1,289 @@
+# app/api/ipc.py
+"""
+Shared-memory handoff between HTTP front-end workers and one inference process.
+
+`python -m app.serve --workers N` starts a single process that loads the
+model and N uvicorn workers that only decode. The images travel through a
+`SlotArena`, which is one SharedMemory block of fixed uint8 (H, W, 3)
+slots. Each front-end owns a disjoint range of slots. Only small tuples go
+through the multiprocessing queues: (worker, slot, request id) on the way in
+and the top-k rows on the way back. The pixels themselves are never pickled.
+
+Each reply names the model version that produced it, and the inference
+process pushes its model status (active model, activation, last swap) down
+the same per-worker queues whenever it changes. A front-end therefore sees
+a hot swap in order with the replies around it.
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from app.api import inference, profiling
+from app.api.registry import model_registry
+from app.api.timing import LatencyHistogram
+from app.utils.labels import CLASS_NAMES
+from app.utils.preprocessing import IMG_SIZE
+
+logger = logging.getLogger(__name__)
+
+SLOT_SHAPE = (IMG_SIZE[1], IMG_SIZE[0], 3)
+
+
+class SlotArena:
+    """A SharedMemory block viewed as `num_slots` uint8 images."""
+
+    def __init__(self, num_slots, name=None, create=False):
+        self.num_slots = num_slots
+        size = num_slots * int(np.prod(SLOT_SHAPE))
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.array = np.ndarray((num_slots,) + SLOT_SHAPE, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class RemoteVersion:
+    """The version, cache key and class list of a model in the inference process."""
+
+    def __init__(self, version, cache_version, class_names):
+        self.version = version
+        self.cache_version = cache_version
+        self.class_names = class_names
+
+
+class Answer(tuple):
+    """(values, indices) for one image, plus the RemoteVersion that produced them."""
+
+    def __new__(cls, values, indices, model):
+        self = super().__new__(cls, (values, indices))
+        self.model = model
+        return self
+
+
+class InferenceClient:
+    """
+    Front-end side: copies images into this worker's slots and resolves one
+    Future per image when the inference process answers. `submit` blocks
+    when every slot is in use, which caps the work a worker can queue.
+    """
+
+    def __init__(self, worker_id, arena, slots, requests, responses):
+        self.worker_id = worker_id
+        self.arena = arena
+        self.requests = requests
+        self.responses = responses
+        # the inference process's model_status(), as last pushed
+        self.status = None
+        self._status_ready = threading.Event()
+        self._free = queue.Queue()
+        for s in slots:
+            self._free.put(s)
+        self.num_slots = len(slots)
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._models = {}
+        # request round trip per image, including the wait for a batch
+        self.latency = LatencyHistogram()
+        self._thread = threading.Thread(target=self._dispatch, name="crop-ipc-client", daemon=True)
+        self._thread.start()
+
+    def model(self, version=None, cache_version=None):
+        """RemoteVersion for a version the inference process reported; the active one by default."""
+        if version is None:
+            active = self.status["active"]
+            version, cache_version = active["version"], active["cache_version"]
+        m = self._models.get(cache_version)
+        if m is None:
+            try:
+                names = model_registry.get(version).class_names
+            except (KeyError, FileNotFoundError):
+                names = CLASS_NAMES
+            m = self._models[cache_version] = RemoteVersion(version, cache_version, names)
+        return m
+
+    def wait_ready(self, timeout=None):
+        # the first status push comes once the model is loaded and warmed up
+        if not self._status_ready.wait(timeout):
+            raise inference.ModelNotReady("Inference process is still loading")
+
+    def submit(self, inp):
+        slot = self._free.get()
+        self.arena.array[slot] = inp
+        fut = Future()
+        req_id = next(self._ids)
+        with self._lock:
+            self._pending[req_id] = (fut, slot, time.perf_counter())
+        self.requests.put(("predict", self.worker_id, slot, req_id))
+        return fut
+
+    def activate(self, version):
+        if self.status is not None and self.status["activating"]:
+            raise RuntimeError(f"Activation of {self.status['activating']} already in progress")
+        self.requests.put(("activate", version))
+
+    def profile(self, seconds, interval_ms, tf_trace):
+        self.requests.put(("profile", seconds, interval_ms, tf_trace))
+
+    def _dispatch(self):
+        while True:
+            msg = self.responses.get()
+            if msg is None:
+                break
+            if msg[0] == "status":
+                self.status = msg[1]
+                self._status_ready.set()
+                continue
+            _, req_id, values, indices, answered_by, error = msg
+            with self._lock:
+                fut, slot, t0 = self._pending.pop(req_id)
+            self._free.put(slot)
+            self.latency.observe((time.perf_counter() - t0) * 1000.0)
+            if error is not None:
+                fut.set_exception(RuntimeError(error))
+            else:
+                fut.set_result(Answer(values, indices, self.model(*answered_by)))
+
+    def stats(self):
+        return {"worker": self.worker_id, "slots": self.num_slots,
+                "slots_in_use": self.num_slots - self._free.qsize(),
+                "pending": len(self._pending)}
+
+
+class RemoteModel(inference.LoadedModel):
+    """
+    Stands in for a LoadedModel in a front-end worker. The version follows
+    the inference process, so a hot swap there shows up here without a
+    reload. Requests already in flight may be answered by either model; their
+    Answer says which (see inference.answered_by).
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.runtime = None
+        self.path = None
+        self.loaded_at = time.time()
+        self.latency = client.latency
+        # crop heads live in the inference process; hints only mask here
+        self.heads = {}
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    @property
+    def version(self):
+        return self.client.model().version
+
+    @property
+    def cache_version(self):
+        return self.client.model().cache_version
+
+    @property
+    def class_names(self):
+        return self.client.model().class_names
+
+    def submit(self, inp):
+        return self.client.submit(inp)
+
+    def submit_many(self, batch):
+        # rows go through the slots one by one; the inference process batches them again
+        futs = [self.submit(inp) for inp in batch]
+        out = Future()
+        lock = threading.Lock()
+
+        def gather(_):
+            with lock:
+                if out.running() or out.done() or not all(f.done() for f in futs):
+                    return
+                out.set_running_or_notify_cancel()
+            try:
+                rows = [f.result() for f in futs]
+                if len({r.model.cache_version for r in rows}) > 1:
+                    raise inference.ModelNotReady("Model was swapped while the batch was in flight; retry")
+                out.set_result(Answer(np.stack([v for v, _ in rows]), np.stack([i for _, i in rows]), rows[0].model))
+            except Exception as e:
+                out.set_exception(e)
+
+        for f in futs:
+            f.add_done_callback(gather)
+        return out
+
+    def __call__(self, batch):
+        return self.submit_many(batch).result()
+
+    def info(self):
+        # the inference process's view of its model, plus this worker's round trips
+        info = dict(self.client.status["active"], runtime="remote")
+        info["ipc"] = dict(self.client.stats(), inflight=self._inflight, latency=self.latency.snapshot())
+        return info
+
+    def status(self):
+        return dict(self.client.status, active=self.info())
+
+
+def serve_inference(arena_name, num_slots, requests, responses):
+    """
+    Body of the inference process: load the model, then feed every slot
+    that a front-end hands over into the shared MicroBatcher.
+    """
+    arena = SlotArena(num_slots, name=arena_name)
+    profiling.install_signal_handler()
+
+    def publish(status):
+        for q in responses:
+            q.put(("status", status))
+
+    inference.wait_until_ready()
+    # activations swap the model on a background thread; every change is
+    # pushed, so front-ends never act on a stale version
+    inference.add_status_listener(publish)
+    publish(inference.model_status())
+
+    def reply(m, worker, req_id, fut):
+        inference.release_model(m)
+        try:
+            values, indices = fut.result()
+            responses[worker].put(("reply", req_id, values, indices, (m.version, m.cache_version), None))
+        except Exception as e:
+            responses[worker].put(("reply", req_id, None, None, None, f"{type(e).__name__}: {e}"))
+
+    while True:
+        msg = requests.get()
+        if msg is None:
+            break
+        if msg[0] == "activate":
+            try:
+                inference.start_activation(msg[1])
+            except Exception:
+                logger.exception("Activation of %s rejected", msg[1])
+            continue
+        if msg[0] == "profile":
+            try:
+                profiling.start_profile(*msg[1:])
+            except RuntimeError as e:
+                logger.warning("%s", e)
+            continue
+        _, worker, slot, req_id = msg
+        try:
+            m = inference.acquire_model()
+            # the batcher copies the slot into its own buffer before the
+            # reply frees it for the front-end
+            fut = m.submit(arena.array[slot])
+        except Exception as e:
+            responses[worker].put(("reply", req_id, None, None, None, f"{type(e).__name__}: {e}"))
+            continue
+        fut.add_done_callback(lambda f, m=m, w=worker, r=req_id: reply(m, w, r, f))
+    arena.close()
@@ -0,0 +1,88 @@
+# app/api/metrics.py
+"""
+Request-stage timings and prediction counters, exposed by `/metrics` in the
+Prometheus text format (version 0.0.4). Recording is a perf_counter call
+plus a short locked update, so it stays on for every request.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from app.api.timing import LatencyHistogram
+
+STAGES = ("upload_read", "decode", "preprocess", "forward", "postprocess", "serialize")
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, float("inf"))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def _le(bound, scale):
+    return "+Inf" if bound == float("inf") else repr(bound * scale)
+
+
+def format_metric(name, kind, help_text, samples):
+    """One metric family; `samples` is a list of (labels dict, value)."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines)
+
+
+def format_histogram(name, help_text, hists, scale=1.0):
+    """`hists` maps a labels tuple (of pairs) to a LatencyHistogram; bounds times `scale`."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, hist in hists.items():
+        labels = dict(labels)
+        buckets, counts, total, count = hist.totals()
+        seen = 0
+        for bound, c in zip(buckets, counts):
+            seen += c
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=_le(bound, scale)))} {seen}")
+        lines.append(f"{name}_sum{_labels(labels)} {total * scale}")
+        lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines)
+
+
+class Metrics:
+    def __init__(self):
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.batch_sizes = LatencyHistogram(BATCH_SIZE_BUCKETS)
+        self._labels = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms, n=1):
+        self.stages[stage].observe(ms, n)
+
+    @contextmanager
+    def time(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage].observe((time.perf_counter() - t0) * 1000.0)
+
+    def count_label(self, label):
+        with self._lock:
+            self._labels[label] += 1
+
+    def render(self):
+        with self._lock:
+            labels = sorted(self._labels.items())
+        return "\n".join([
+            format_histogram("crop_stage_seconds", "Time spent in each request stage.",
+                             {(("stage", s),): h for s, h in self.stages.items()}, scale=0.001),
+            format_histogram("crop_batch_size", "Images per model forward pass.", {(): self.batch_sizes}),
+            format_metric("crop_predictions_total", "counter",
+                          "Predictions returned, by label (including Unrecognized).",
+                          [({"label": k}, v) for k, v in labels]),
+        ])
+
+
+metrics = Metrics()
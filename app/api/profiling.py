@@ -0,0 +1,177 @@
+# app/api/profiling.py
+"""
+On-demand profiling of a running server.
+
+A session runs for a bounded window. Start one with
+`POST /admin/profile?seconds=10` or by sending SIGUSR1 to a server process
+(`kill -USR1 <pid>`). While it runs:
+
+- a sampler thread reads every thread's Python stack every `interval_ms` and
+  writes them as folded stacks (`python.folded`), the input format of
+  flamegraph.pl, speedscope and inferno;
+- the TensorFlow profiler records the model calls into `tf/` (open it with
+  TensorBoard's profile plugin).
+
+Output goes to CROP_PROFILE_DIR/<timestamp>-<pid>/. When no session is
+running there is no thread, hook or timer, so the server pays nothing.
+"""
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(os.getenv("CROP_PROFILE_DIR", "logs/profiles"))
+PROFILE_SECONDS = float(os.getenv("CROP_PROFILE_SECONDS", "10"))
+PROFILE_INTERVAL_MS = float(os.getenv("CROP_PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = 300.0
+
+_lock = threading.Lock()
+_session = None
+_last = None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    def __init__(self, seconds, interval_ms, tf_trace, out_dir):
+        self.seconds = seconds
+        self.interval = interval_ms / 1000.0
+        self.tf_trace = tf_trace
+        self.out_dir = out_dir
+        self.started_at = time.time()
+        self.samples = 0
+        self.tf_error = None
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="crop-profiler", daemon=True)
+
+    def start(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if self.tf_trace:
+            try:
+                import tensorflow as tf
+                tf.profiler.experimental.start(str(self.out_dir / "tf"))
+            except Exception as e:
+                # e.g. another TF profiler session is already running
+                self.tf_error = str(e)
+                self.tf_trace = False
+        self._thread.start()
+
+    def _sample(self, own):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self._stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                self._sample(own)
+                self._stop.wait(self.interval)
+        finally:
+            self._finish()
+
+    def _finish(self):
+        global _session, _last
+        if self.tf_trace:
+            try:
+                import tensorflow as tf
+                tf.profiler.experimental.stop()
+            except Exception as e:
+                self.tf_error = str(e)
+        with open(self.out_dir / "python.folded", "w") as fh:
+            for stack, n in self._stacks.most_common():
+                fh.write(f"{stack} {n}\n")
+        info = self.info()
+        (self.out_dir / "meta.json").write_text(json.dumps(info, indent=2))
+        logger.info("Profile written to %s (%d samples)", self.out_dir, self.samples)
+        with _lock:
+            _session, _last = None, info
+
+    def stop(self):
+        self._stop.set()
+
+    def info(self):
+        return {
+            "dir": str(self.out_dir),
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "interval_ms": self.interval * 1000.0,
+            "samples": self.samples,
+            "tf_trace": self.tf_trace,
+            "tf_error": self.tf_error,
+        }
+
+
+def start_profile(seconds=PROFILE_SECONDS, interval_ms=PROFILE_INTERVAL_MS, tf_trace=True):
+    """Start a profiling window; RuntimeError if one is already running."""
+    global _session
+    seconds = min(max(0.1, float(seconds)), PROFILE_MAX_SECONDS)
+    interval_ms = max(1.0, float(interval_ms))
+    with _lock:
+        if _session is not None:
+            raise RuntimeError(f"Profiling already running, writing to {_session.out_dir}")
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        _session = ProfileSession(seconds, interval_ms, tf_trace, PROFILE_DIR / f"{stamp}-{os.getpid()}")
+        session = _session
+    session.start()
+    logger.info("Profiling for %.0fs into %s", seconds, session.out_dir)
+    return session.info()
+
+
+def stop_profile():
+    s = _session
+    if s is not None:
+        s.stop()
+    return s is not None
+
+
+def profile_status():
+    s = _session
+    return {"running": s.info() if s is not None else None, "last": _last}
+
+
+def on_signal(*_, tf_trace=True):
+    """SIGUSR1 handler: start a default-length session unless one is running."""
+    # the sampler thread does the work; nothing blocks in the signal handler
+    threading.Thread(target=_start_quietly, args=(tf_trace,), name="crop-profiler-start", daemon=True).start()
+
+
+def _start_quietly(tf_trace=True):
+    try:
+        start_profile(tf_trace=tf_trace)
+    except RuntimeError as e:
+        logger.warning("%s", e)
+
+
+def install_signal_handler(loop=None, tf_trace=True):
+    """Start a session on SIGUSR1; a no-op where the signal does not exist."""
+    import signal
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    handler = on_signal if tf_trace else functools.partial(on_signal, tf_trace=False)
+    if loop is not None:
+        loop.add_signal_handler(signal.SIGUSR1, handler)
+    else:
+        signal.signal(signal.SIGUSR1, handler)
+    return True
@@ -0,0 +1,150 @@
+# app/api/registry.py
+"""
+Local model registry: one sub-directory per model version.
+
+    model/registry/
+        ACTIVE                      <- name of the version served on startup
+        v1/metadata.json            <- {"version", "artifact", "class_names", ...}
+        v1/model.keras              <- or model.tflite
+
+Register an artifact with
+
+    python -m app.api.registry register model/PlantRecogModelv1.keras --version v1
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+from app.utils.labels import CLASS_NAMES
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+REGISTRY_DIR = Path(os.getenv("CROP_MODEL_REGISTRY", PROJECT_ROOT / "model" / "registry"))
+
+
+class ModelEntry:
+    """A registered model version: artifact path, class list and metadata."""
+
+    def __init__(self, version, path, class_names, metadata):
+        self.version = version
+        self.path = Path(path)
+        self.class_names = list(class_names)
+        self.metadata = metadata
+
+    def to_dict(self):
+        meta = {k: v for k, v in self.metadata.items() if k != "class_names"}
+        return dict(meta, version=self.version, path=str(self.path), num_classes=len(self.class_names))
+
+
+def _check_version(version):
+    # versions are directory names; keep them inside the registry
+    if not version or version != Path(version).name or version.startswith("."):
+        raise KeyError(f"Invalid model version: {version!r}")
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = Path(root)
+
+    def _entry(self, version_dir):
+        meta = json.loads((version_dir / "metadata.json").read_text())
+        version = meta.get("version", version_dir.name)
+        artifact = version_dir / meta.get("artifact", "model.keras")
+        return ModelEntry(version, artifact, meta.get("class_names") or CLASS_NAMES, meta)
+
+    def list(self):
+        if not self.root.is_dir():
+            return []
+        return [self._entry(d) for d in sorted(self.root.iterdir()) if (d / "metadata.json").is_file()]
+
+    def get(self, version):
+        _check_version(version)
+        d = self.root / version
+        if not (d / "metadata.json").is_file():
+            raise KeyError(f"Unknown model version: {version}")
+        entry = self._entry(d)
+        if not entry.path.exists():
+            raise FileNotFoundError(f"Model artifact missing for {version}: {entry.path}")
+        return entry
+
+    def active_version(self):
+        p = self.root / "ACTIVE"
+        if not p.is_file():
+            return None
+        return p.read_text().strip() or None
+
+    def set_active(self, version):
+        self.get(version)
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / "ACTIVE.tmp"
+        tmp.write_text(version + "\n")
+        tmp.replace(self.root / "ACTIVE")
+
+    def register(self, artifact, version, class_names=None, description="", cascade=None, crop_heads=None):
+        """Copy `artifact` into the registry as `version` and write its metadata."""
+        _check_version(version)
+        artifact = Path(artifact)
+        d = self.root / version
+        if d.exists():
+            raise FileExistsError(f"Model version already registered: {version}")
+        d.mkdir(parents=True)
+        target = d / ("model" + artifact.suffix)
+        shutil.copy2(artifact, target)
+        meta = {
+            "version": version,
+            "artifact": target.name,
+            "class_names": list(class_names or CLASS_NAMES),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "source": str(artifact),
+            "description": description,
+        }
+        if cascade:
+            # {"first": <version or path>, "threshold": float}: serve behind a cheaper model
+            meta["cascade"] = cascade
+        if crop_heads:
+            # {crop: <version or path>}: smaller models for images with a crop hint
+            meta["crop_heads"] = crop_heads
+        (d / "metadata.json").write_text(json.dumps(meta, indent=2))
+        return self._entry(d)
+
+
+model_registry = ModelRegistry()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    reg = sub.add_parser("register")
+    reg.add_argument("artifact")
+    reg.add_argument("--version", required=True)
+    reg.add_argument("--class-names", help="JSON file with the class list (defaults to CLASS_NAMES)")
+    reg.add_argument("--description", default="")
+    reg.add_argument("--activate", action="store_true", help="also make it the startup version")
+    reg.add_argument("--cascade-first", help="cheaper model (version or path) to run first; escalate to this one")
+    reg.add_argument("--cascade-threshold", type=float, default=0.85,
+                     help="first-stage confidence below which images are escalated")
+    reg.add_argument("--crop-head", action="append", default=[], metavar="CROP=MODEL",
+                     help="head (version or path) for one crop's classes; repeatable")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "list":
+        active = model_registry.active_version()
+        for entry in model_registry.list():
+            mark = "*" if entry.version == active else " "
+            print(f"{mark} {entry.version:<20} {entry.path.name:<16} {entry.metadata.get('created', '')}")
+        return
+
+    class_names = json.loads(Path(args.class_names).read_text()) if args.class_names else None
+    cascade = {"first": args.cascade_first, "threshold": args.cascade_threshold} if args.cascade_first else None
+    crop_heads = dict(item.split("=", 1) for item in args.crop_head)
+    entry = model_registry.register(args.artifact, args.version, class_names, args.description, cascade, crop_heads)
+    if args.activate:
+        model_registry.set_active(entry.version)
+    print(f"Registered {entry.version} at {entry.path}")
+
+
+if __name__ == "__main__":
+    main()
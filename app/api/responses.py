@@ -0,0 +1,176 @@
+# app/api/responses.py
+"""
+Prediction response encoding.
+
+`DISEASE_INFO` is compiled once into `disease_index`, which keys the entries
+by normalized label. Each entry holds its causes/suggestions as tuples, and
+also the two fields already serialized as JSON and MessagePack. A prediction
+shares its entry's tuples. The encoder recognizes them by identity and
+splices the stored bytes in, so only the small per-request fields are
+encoded.
+
+Responses are slim: the `_matched_info` copy of causes/suggestions is only
+added with `?debug=1`. Clients get MessagePack with `Accept:
+application/msgpack` (needs the msgpack package) and JSON otherwise. Batch
+responses are brotli- or gzip-compressed when the client accepts it and the
+body is at least CROP_COMPRESS_MIN_BYTES.
+"""
+import gzip
+import json
+import os
+from types import MappingProxyType
+
+from starlette.responses import Response
+
+from app.utils.disease_info import DISEASE_INFO
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COMPRESS_MIN_BYTES = int(os.getenv("CROP_COMPRESS_MIN_BYTES", "1024"))
+INFO_FIELDS = ("causes", "suggestions")
+
+
+def _default(obj):
+    # numpy scalars and arrays that slipped into a result
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def dumps_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def _pack(obj):
+    return msgpack.packb(obj, default=_default)
+
+
+def normalize_label(label):
+    return label.strip().lower()
+
+
+class DiseaseEntry:
+    __slots__ = ("label", "causes", "suggestions", "json", "msgpack")
+
+    def __init__(self, label, info):
+        self.label = label
+        self.causes = tuple(info.get("causes") or ())
+        self.suggestions = tuple(info.get("suggestions") or ())
+        fields = {"causes": self.causes, "suggestions": self.suggestions}
+        # the two key/value pairs without the enclosing braces / map header
+        self.json = dumps_json(fields)[1:-1]
+        self.msgpack = b"".join(_pack(k) + _pack(v) for k, v in fields.items()) if msgpack else None
+
+    def as_dict(self):
+        return {"causes": list(self.causes), "suggestions": list(self.suggestions)}
+
+
+class DiseaseIndex:
+    """Read-only DISEASE_INFO lookup by normalized label, UNKNOWN as the fallback."""
+
+    def __init__(self, info):
+        entries = {}
+        for label, value in info.items():
+            entries.setdefault(normalize_label(label), DiseaseEntry(label, value))
+        self._entries = MappingProxyType(entries)
+        self.unknown = entries.get("unknown") or DiseaseEntry("UNKNOWN", {})
+        # what an Unrecognized prediction carries
+        self.empty = DiseaseEntry("", {})
+
+    def get(self, label):
+        return self._entries.get(normalize_label(label), self.unknown)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+disease_index = DiseaseIndex(DISEASE_INFO)
+
+
+def _entry_of(result):
+    # the entry whose tuples this result shares, if any (not after a disk-cache round trip)
+    causes, suggestions = result.get("causes"), result.get("suggestions")
+    for entry in (disease_index.get(result.get("label") or ""), disease_index.empty):
+        if causes is entry.causes and suggestions is entry.suggestions:
+            return entry
+    return None
+
+
+def debug_result(result):
+    """`result` with the `_matched_info` debug payload added."""
+    label = result.get("label") or ""
+    info = {} if label == "Unrecognized" else disease_index.get(label).as_dict()
+    return dict(result, _matched_info=info)
+
+
+def encode_result(result, media_type=JSON):
+    entry = _entry_of(result)
+    rest = {k: v for k, v in result.items() if k not in INFO_FIELDS} if entry is not None else result
+    if media_type == MSGPACK:
+        if entry is None:
+            return _pack(result)
+        packer = msgpack.Packer(default=_default)
+        return (packer.pack_map_header(len(rest) + 2) + entry.msgpack
+                + b"".join(packer.pack(k) + packer.pack(v) for k, v in rest.items()))
+    if entry is None:
+        return dumps_json(result)
+    body = dumps_json(rest)
+    return b"{" + entry.json + (b"," + body[1:] if len(body) > 2 else b"}")
+
+
+def encode_batch(results, media_type=JSON):
+    parts = [encode_result(r, media_type) for r in results]
+    if media_type == MSGPACK:
+        packer = msgpack.Packer()
+        return (packer.pack_map_header(2) + packer.pack("count") + packer.pack(len(parts))
+                + packer.pack("results") + packer.pack_array_header(len(parts)) + b"".join(parts))
+    return b'{"count":%d,"results":[' % len(parts) + b",".join(parts) + b"]}"
+
+
+def negotiate(accept):
+    """MSGPACK when the client asks for it and msgpack is installed, else JSON."""
+    accept = (accept or "").lower()
+    if msgpack is not None and ("application/msgpack" in accept or "application/x-msgpack" in accept):
+        return MSGPACK
+    return JSON
+
+
+def compress(body, accept_encoding):
+    """(body, content encoding): brotli or gzip when accepted and worth it."""
+    if len(body) < COMPRESS_MIN_BYTES or not accept_encoding:
+        return body, None
+    accepted = {token.split(";")[0].strip().lower() for token in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=4), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+
+def result_response(result, accept=None):
+    media_type = negotiate(accept)
+    return Response(encode_result(result, media_type), media_type=media_type, headers={"Vary": "Accept"})
+
+
+def batch_response(results, accept=None, accept_encoding=None):
+    media_type = negotiate(accept)
+    body, encoding = compress(encode_batch(results, media_type), accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
@@ -1,10 +1,61 @@
 # app/api/routes.py
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+import asyncio
+import hmac
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
 
-from app.api.inference import predict_from_bytes
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-app = FastAPI(title="CropGuardian AI (Local Backend)")
+from app.api.cache import prediction_cache
+from app.api.dedup import near_duplicates
+from app.api.executor import ExecutorSaturated, inference_pool
+from app.api.hierarchy import UnknownCrop
+from app.api.metrics import format_metric, metrics
+from app.api.inference import (
+    ModelNotReady,
+    batcher,
+    is_ready,
+    model_status,
+    predict_batch_from_bytes,
+    predict_from_bytes,
+    predict_tiled_from_bytes,
+    readiness,
+    remote_model,
+    start_activation,
+    start_model_loading,
+)
+from app.api.registry import model_registry
+from app.api.responses import batch_response, debug_result, result_response
+from app.api import profiling, shadow
+from app.api.stream import FrameStream, stream_stats
+from app.api.uploads import NotAnImage, UploadTooLarge, expand_uploads, receive_files, receive_image
+from app.utils.image_io import ImageTooLarge
+
+# DEBUG adds one log line per prediction
+LOG_LEVEL = os.getenv("CROP_LOG_LEVEL", "INFO").upper()
+
+@asynccontextmanager
+async def lifespan(app):
+    # uvicorn only configures its own loggers; a no-op if logging is set up
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("app").setLevel(LOG_LEVEL)
+    # the model loads and warms up in the background; /readyz reports when done
+    start_model_loading()
+    shadow.start_from_env()
+    try:
+        # `kill -USR1 <pid>` profiles this worker for CROP_PROFILE_SECONDS; an
+        # app.serve front end has no model to trace
+        profiling.install_signal_handler(asyncio.get_running_loop(), tf_trace=remote_model() is None)
+    except (NotImplementedError, RuntimeError, ValueError):
+        pass  # not on the main thread (e.g. under a test client)
+    yield
+    shadow.stop_shadow()
+
+app = FastAPI(title="CropGuardian AI (Local Backend)", lifespan=lifespan)
 
 @app.get("/")
 def read_root():
@@ -14,13 +65,298 @@ def read_root():
 def health():
     return {"status": "healthy"}
 
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    if not file:
-        raise HTTPException(status_code=400, detail="No file provided")
+@app.get("/livez")
+def livez():
+    # the process is up and serving HTTP; says nothing about the model
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    state = readiness()
+    return JSONResponse(content=state, status_code=200 if state["status"] == "ready" else 503)
+
+@app.get("/stats")
+def stats():
+    return {
+        "model": model_status()["active"],
+        "executor": inference_pool.stats(),
+        "batcher": batcher.stats(),
+        "cache": prediction_cache.stats() if prediction_cache is not None else None,
+        "near_duplicates": near_duplicates.stats() if near_duplicates is not None else None,
+        "streams": stream_stats.snapshot(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of stage timings, counters and queue gauges."""
+    pool = inference_pool.stats()
+    families = [
+        metrics.render(),
+        format_metric("crop_executor_running", "gauge", "Requests running on the inference pool.",
+                      [({}, pool["running"])]),
+        format_metric("crop_executor_queued", "gauge", "Requests waiting for an inference worker.",
+                      [({}, pool["queued"])]),
+        format_metric("crop_executor_rejected_total", "counter", "Requests rejected with 503 because the queue was full.",
+                      [({}, pool["rejected"])]),
+        format_metric("crop_batcher_pending", "gauge", "Images waiting for the next forward pass.",
+                      [({}, batcher.stats()["pending"])]),
+    ]
+    if prediction_cache is not None:
+        c = prediction_cache.stats()
+        families += [
+            format_metric("crop_cache_lookups_total", "counter", "Prediction cache lookups by result.",
+                          [({"result": "hit"}, c["hits"]), ({"result": "disk_hit"}, c["disk_hits"]),
+                           ({"result": "miss"}, c["misses"])]),
+            format_metric("crop_cache_hit_ratio", "gauge", "Prediction cache hit rate since startup.",
+                          [({}, c["hit_rate"])]),
+        ]
+    if near_duplicates is not None:
+        d = near_duplicates.stats()
+        families += [
+            format_metric("crop_near_duplicate_lookups_total", "counter", "Near-duplicate index lookups.",
+                          [({}, d["lookups"])]),
+            format_metric("crop_near_duplicate_hits_total", "counter", "Predictions reused from a near-duplicate.",
+                          [({}, d["hits"])]),
+        ]
+    cascade = (model_status()["active"] or {}).get("cascade")
+    if cascade is not None:
+        families += [
+            format_metric("crop_cascade_images_total", "counter", "Images scored by the first cascade stage.",
+                          [({}, cascade["images"])]),
+            format_metric("crop_cascade_escalated_total", "counter", "Images escalated to the second cascade stage.",
+                          [({}, cascade["escalated"])]),
+        ]
+    return PlainTextResponse("\n".join(families) + "\n", media_type="text/plain; version=0.0.4")
+
+async def _receive_image(request):
+    # streamed and checked as it arrives instead of FastAPI buffering the form
+    if not is_ready():
+        raise _not_ready()
+    t0 = time.perf_counter()
+    try:
+        upload = await receive_image(request)
+    except (UploadTooLarge, ImageTooLarge) as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except NotAnImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metrics.observe("upload_read", (time.perf_counter() - t0) * 1000.0)
+    return upload
+
+async def _receive_files(request):
+    if not is_ready():
+        raise _not_ready()
+    t0 = time.perf_counter()
     try:
-        image_bytes = await file.read()
-        result = predict_from_bytes(image_bytes)
-        return JSONResponse(content=result)
+        uploads = await receive_files(request)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metrics.observe("upload_read", (time.perf_counter() - t0) * 1000.0)
+    return uploads
+
+# /predict and /predict/tiled read their body themselves; described here for /docs
+_IMAGE_BODY = {"requestBody": {"required": True, "content": {
+    "multipart/form-data": {"schema": {"type": "object", "required": ["file"],
+                                       "properties": {"file": {"type": "string", "format": "binary"}}}},
+    "image/*": {"schema": {"type": "string", "format": "binary"}},
+}}}
+_FILES_BODY = {"requestBody": {"required": True, "content": {
+    "multipart/form-data": {"schema": {"type": "object", "required": ["files"], "properties": {
+        "files": {"type": "array", "items": {"type": "string", "format": "binary"}}}}},
+}}}
+
+def _respond(request, result, debug=False):
+    # JSON or MessagePack per the Accept header; `_matched_info` only with ?debug=1
+    with metrics.time("serialize"):
+        return result_response(debug_result(result) if debug else result, request.headers.get("accept"))
+
+def _not_ready():
+    return HTTPException(status_code=503, detail=readiness(), headers={"Retry-After": "5"})
+
+def _submit(fn, *args):
+    if not is_ready():
+        raise _not_ready()
+    # fail fast with 503 instead of queueing work we can't serve in time
+    try:
+        return inference_pool.submit(fn, *args)
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "1", "X-Queue-Depth": str(inference_pool.queue_depth)},
+        )
+
+@app.post("/predict", openapi_extra=_IMAGE_BODY)
+async def predict(request: Request, crop: Optional[str] = None, debug: bool = False):
+    """`crop` (e.g. "tomato") restricts the diagnosis to that crop's classes."""
+    upload = await _receive_image(request)
+    try:
+        fut = _submit(predict_from_bytes, upload.payload(), crop, upload.digest)
+        result = await asyncio.wrap_future(fut)
+        metrics.count_label(result["label"])
+        return _respond(request, result, debug)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnknownCrop as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ModelNotReady:
+        raise _not_ready()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
+
+@app.post("/predict/tiled", openapi_extra=_IMAGE_BODY)
+async def predict_tiled(request: Request, overlap: float = 0.25, max_tiles: int = 64,
+                        crop: Optional[str] = None, debug: bool = False):
+    """Predict a large field or drone image from overlapping tiles; adds a heatmap."""
+    if not 0.0 <= overlap < 1.0:
+        raise HTTPException(status_code=400, detail="overlap must be in [0, 1)")
+    if max_tiles < 1:
+        raise HTTPException(status_code=400, detail="max_tiles must be at least 1")
+    upload = await _receive_image(request)
+    try:
+        fut = _submit(predict_tiled_from_bytes, upload.payload(), overlap, max_tiles, crop)
+        result = await asyncio.wrap_future(fut)
+        metrics.count_label(result["label"])
+        return _respond(request, result, debug)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnknownCrop as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ModelNotReady:
+        raise _not_ready()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        upload.close()
+
+@app.post("/predict/batch", openapi_extra=_FILES_BODY)
+async def predict_batch(request: Request, crop: Optional[str] = None, debug: bool = False):
+    """Predict many images, given as separate files and/or zip/tar archives."""
+    uploads = await _receive_files(request)
+    try:
+        if not uploads:
+            raise HTTPException(status_code=400, detail="No files provided")
+        try:
+            # archives are read through the spooled buffers, not copied out of them
+            images = expand_uploads([(u.filename, u.payload()) for u in uploads])
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not images:
+            raise HTTPException(status_code=400, detail="No images found in upload")
+        fut = _submit(predict_batch_from_bytes, [data for _, data in images], crop)
+        try:
+            results = await asyncio.wrap_future(fut)
+        except UnknownCrop as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ModelNotReady:
+            raise _not_ready()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        for upload in uploads:
+            upload.close()
+    for res in results:
+        if "label" in res:
+            metrics.count_label(res["label"])
+    rows = [{"filename": name, **(debug_result(res) if debug and "label" in res else res)}
+            for (name, _), res in zip(images, results)]
+    # {"count", "results"}; compressed when the client sends Accept-Encoding
+    with metrics.time("serialize"):
+        return batch_response(rows, request.headers.get("accept"), request.headers.get("accept-encoding"))
+
+@app.websocket("/ws/predict")
+async def predict_stream(ws: WebSocket):
+    """Binary JPEG frames in, one smoothed JSON diagnosis per processed frame out."""
+    await ws.accept()
+    if not is_ready():
+        # 1013: try again later
+        await ws.close(code=1013, reason="Model is still loading")
+        return
+    await FrameStream(ws).run()
+
+# --- admin: model registry and hot swap ---
+# /admin routes are off unless CROP_ADMIN_TOKEN is set, and then require a
+# matching X-Admin-Token header
+ADMIN_TOKEN = os.getenv("CROP_ADMIN_TOKEN")
+
+def _check_admin(x_admin_token: str = Header(default="")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled; set CROP_ADMIN_TOKEN")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/models", dependencies=[Depends(_check_admin)])
+def list_models():
+    return {
+        "versions": [e.to_dict() for e in model_registry.list()],
+        **model_status(),
+    }
+
+@app.post("/admin/models/{version}/activate", dependencies=[Depends(_check_admin)], status_code=202)
+def activate_model(version: str):
+    """Load `version` in the background, warm it up and swap it in."""
+    try:
+        start_activation(version)
+    except (KeyError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "activating", "version": version}
+
+@app.get("/admin/shadow", dependencies=[Depends(_check_admin)])
+def shadow_stats():
+    return shadow.shadow_status()
+
+@app.post("/admin/shadow", dependencies=[Depends(_check_admin)], status_code=202)
+def start_shadow(model: str, sample_rate: float = 1.0):
+    """Shadow registry version `model` on a fraction of traffic."""
+    if not 0.0 < sample_rate <= 1.0:
+        raise HTTPException(status_code=400, detail="sample_rate must be in (0, 1]")
+    # only registered versions; file paths are for CROP_SHADOW_MODEL at startup
+    try:
+        model_registry.get(model)
+    except (KeyError, FileNotFoundError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    shadow.start_shadow(model, sample_rate)
+    return {"status": "loading", "model": model, "sample_rate": sample_rate}
+
+@app.delete("/admin/shadow", dependencies=[Depends(_check_admin)])
+def stop_shadow():
+    return {"stopped": shadow.stop_shadow()}
+
+@app.get("/admin/profile", dependencies=[Depends(_check_admin)])
+def profile_status():
+    return profiling.profile_status()
+
+@app.post("/admin/profile", dependencies=[Depends(_check_admin)], status_code=202)
+def start_profile(seconds: float = profiling.PROFILE_SECONDS, interval_ms: float = profiling.PROFILE_INTERVAL_MS,
+                  tf_trace: bool = True):
+    """Sample Python stacks (and trace TensorFlow) for `seconds`; files land in CROP_PROFILE_DIR."""
+    if not 0.0 < seconds <= profiling.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {profiling.PROFILE_MAX_SECONDS:g}]")
+    remote = remote_model()
+    try:
+        # with app.serve the model (and TensorFlow) lives in the inference
+        # process, which records the trace; don't import TF in this worker
+        info = profiling.start_profile(seconds, interval_ms, tf_trace and remote is None)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if remote is not None:
+        # the model runs in the inference process; profile it for the same window
+        remote.client.profile(seconds, interval_ms, tf_trace)
+    return {"status": "profiling", **info}
+
+@app.delete("/admin/profile", dependencies=[Depends(_check_admin)])
+def stop_profile():
+    return {"stopped": profiling.stop_profile()}
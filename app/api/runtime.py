@@ -0,0 +1,215 @@
+# app/api/runtime.py
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.api.timing import LatencyHistogram
+
+# TensorFlow is imported by the runtime that needs it, when a model is loaded,
+# so importing the API (or anything under app.utils) stays cheap
+
+# number of (label, confidence) pairs returned per image; 0 = every class,
+# which crop hints and the crop -> disease hierarchy need to be exact
+TOP_K = int(os.getenv("CROP_TOP_K", "0"))
+# rows whose sum is this close to 1 are taken as probabilities (no softmax);
+# loose enough for float16 and quantized outputs
+PROBS_ATOL = 1e-3
+# cascade: rows whose first-stage confidence is below this go to the big model
+CASCADE_THRESHOLD = float(os.getenv("CROP_CASCADE_THRESHOLD", "0.85"))
+# interpreter threads per TFLite runtime (XNNPACK uses the same pool)
+TFLITE_THREADS = int(os.getenv("CROP_TFLITE_THREADS", str(os.cpu_count() or 1)))
+
+
+def _topk(probs, k):
+    idx = np.argpartition(-probs, k - 1, axis=-1)[:, :k]
+    vals = np.take_along_axis(probs, idx, axis=-1)
+    order = np.argsort(-vals, axis=-1)
+    return np.take_along_axis(vals, order, axis=-1), np.take_along_axis(idx, order, axis=-1).astype(np.int32)
+
+
+def clamp_k(k, num_classes):
+    return num_classes if k <= 0 else min(int(k), num_classes)
+
+
+def bucket_size(n):
+    """Power-of-two batch size that `n` rows are padded to."""
+    return 1 << (n - 1).bit_length()
+
+
+def _interpreter_class():
+    # the standalone tflite-runtime wheel avoids importing all of TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class KerasRuntime:
+    """Runs a loaded Keras model through the compiled ServingModel graph."""
+
+    kind = "keras"
+
+    def __init__(self, model, k=TOP_K):
+        from app.api.serving import ServingModel
+        self.serving = ServingModel(model, k=k)
+        self.k = self.serving.k
+        self.num_classes = self.serving.num_classes
+
+    def __call__(self, batch):
+        return self.serving(batch)
+
+
+class TFLiteRuntime:
+    """
+    Runs a `.tflite` model (float32, float16, dynamic-range or full-integer)
+    on the TFLite interpreter with the default XNNPACK delegate. Batches are
+    padded to power-of-two sizes, with one interpreter and one input buffer
+    per size, so nothing is reallocated in steady state. Weights are shared through mmap.
+    Same interface as KerasRuntime: uint8 (N,H,W,3) in, top-k
+    (values, indices) out.
+    """
+
+    kind = "tflite"
+
+    def __init__(self, path, k=TOP_K, num_threads=TFLITE_THREADS):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"Model file not found at: {self.path.resolve()}")
+        self.num_threads = num_threads
+        self._interpreters = {}
+        self._inputs = {}  # size -> padded input buffer, filled in place
+        self._lock = threading.Lock()
+        probe = self._interpreter(1)
+        self.num_classes = int(probe.get_output_details()[0]["shape"][-1])
+        self.k = clamp_k(k, self.num_classes)
+
+    def _interpreter(self, size):
+        interp = self._interpreters.get(size)
+        if interp is None:
+            interp = _interpreter_class()(model_path=str(self.path), num_threads=self.num_threads)
+            inp = interp.get_input_details()[0]
+            if inp["shape"][0] != size:
+                interp.resize_tensor_input(inp["index"], [size] + list(inp["shape"][1:]), strict=False)
+            interp.allocate_tensors()
+            self._interpreters[size] = interp
+            self._inputs[size] = np.zeros([size] + list(inp["shape"][1:]), dtype=inp["dtype"])
+        return interp
+
+    def probs(self, batch):
+        """Full (N, num_classes) probabilities for a uint8 batch."""
+        n = len(batch)
+        size = bucket_size(n)
+        with self._lock:
+            interp = self._interpreter(size)
+            inp = interp.get_input_details()[0]
+            out = interp.get_output_details()[0]
+            # rows past n keep stale pixels; their outputs are dropped below
+            x = self._inputs[size]
+            scale, zero = inp["quantization"]
+            if inp["dtype"] in (np.uint8, np.int8) and scale:
+                info = np.iinfo(inp["dtype"])
+                np.clip(np.round(batch / scale + zero), info.min, info.max, out=x[:n], casting="unsafe")
+            else:
+                # EfficientNet's preprocess_input is the identity: raw pixels in
+                x[:n] = batch
+            interp.set_tensor(inp["index"], x)
+            interp.invoke()
+            y = interp.get_tensor(out["index"])[:n]
+            scale, zero = out["quantization"]
+            if out["dtype"] in (np.uint8, np.int8) and scale:
+                y = (y.astype(np.float32) - zero) * scale
+            y = y.astype(np.float32)
+        # logits get a softmax; probability rows pass through
+        is_probs = np.abs(y.sum(axis=-1, keepdims=True) - 1.0) <= PROBS_ATOL
+        if not is_probs.all():
+            e = np.exp(y - y.max(axis=-1, keepdims=True))
+            y = np.where(is_probs, y, e / e.sum(axis=-1, keepdims=True))
+        return y
+
+    def __call__(self, batch):
+        return _topk(self.probs(batch), self.k)
+
+
+class SubsetRuntime:
+    """
+    A head trained on a subset of the served model's classes (e.g. one
+    crop). Its indices are mapped back to the served model's classes, so
+    its output can be post-processed like the full model's.
+    """
+
+    kind = "subset"
+
+    def __init__(self, runtime, class_ids, num_classes):
+        if runtime.num_classes != len(class_ids):
+            raise ValueError(f"Head has {runtime.num_classes} outputs for {len(class_ids)} classes")
+        self.runtime = runtime
+        self.class_ids = np.asarray(class_ids, dtype=np.int32)
+        self.k = runtime.k
+        self.num_classes = num_classes
+
+    def __call__(self, batch):
+        values, indices = self.runtime(batch)
+        return values, self.class_ids[indices]
+
+
+class CascadeRuntime:
+    """
+    A cheap model in front of the served one. Every image goes through
+    `first`, and only rows whose top confidence is below `threshold` are
+    re-run on `second`, whose answer replaces the first one. Both runtimes
+    must score the same classes. Escalation counts and per-image latency of
+    each stage are kept for /stats.
+    """
+
+    kind = "cascade"
+
+    def __init__(self, first, second, threshold=CASCADE_THRESHOLD):
+        if first.num_classes != second.num_classes:
+            raise ValueError(f"Cascade stages disagree on classes: {first.num_classes} vs {second.num_classes}")
+        self.first = first
+        self.second = second
+        self.threshold = float(threshold)
+        self.k = min(first.k, second.k)
+        self.num_classes = second.num_classes
+        self.first_latency = LatencyHistogram()
+        self.second_latency = LatencyHistogram()
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+
+    def __call__(self, batch):
+        n = len(batch)
+        t0 = time.perf_counter()
+        values, indices = self.first(batch)
+        values, indices = np.array(values[:, :self.k]), np.array(indices[:, :self.k])
+        self.first_latency.observe((time.perf_counter() - t0) * 1000.0 / n, n)
+        unsure = np.flatnonzero(values[:, 0] < self.threshold)
+        if len(unsure):
+            t0 = time.perf_counter()
+            v2, i2 = self.second(batch[unsure])
+            values[unsure], indices[unsure] = v2[:, :self.k], i2[:, :self.k]
+            self.second_latency.observe((time.perf_counter() - t0) * 1000.0 / len(unsure), len(unsure))
+        with self._lock:
+            self.images += n
+            self.escalated += len(unsure)
+        return values, indices
+
+    def stats(self):
+        with self._lock:
+            images, escalated = self.images, self.escalated
+        return {
+            "threshold": self.threshold,
+            "stages": [self.first.kind, self.second.kind],
+            "images": images,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / images, 4) if images else None,
+            "latency_per_image_ms": {
+                "first": self.first_latency.snapshot(),
+                "second": self.second_latency.snapshot(),
+            },
+        }
@@ -0,0 +1,53 @@
+# app/api/serving.py
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications.efficientnet import preprocess_input
+
+from app.api.runtime import PROBS_ATOL, TOP_K, bucket_size, clamp_k
+
+# XLA-compile the serving graph; batches are then padded to power-of-two
+# sizes so only a handful of shapes are ever compiled
+JIT_COMPILE = os.getenv("CROP_JIT_COMPILE", "0") == "1"
+
+
+class ServingModel:
+    """
+    A loaded Keras model folded into a single tf.function with a fixed input
+    signature: uint8 (N,H,W,3) images -> preprocess_input -> forward pass ->
+    softmax (only for rows that are not already probabilities) -> top-k.
+
+    Calling it returns numpy `(values, indices)` of shape (N,k), so only the
+    top-k leave the graph instead of the full output through Keras' predict loop.
+    """
+
+    def __init__(self, model, k=TOP_K, jit_compile=JIT_COMPILE):
+        self.model = model
+        self.input_shape = tuple(model.input_shape[1:])
+        self.num_classes = int(model.output_shape[-1])
+        self.k = clamp_k(k, self.num_classes)
+        self.jit_compile = jit_compile
+        self._fn = tf.function(
+            self._serve,
+            input_signature=[tf.TensorSpec((None,) + self.input_shape, tf.uint8)],
+            jit_compile=jit_compile,
+        )
+
+    def _serve(self, images):
+        x = preprocess_input(tf.cast(images, tf.float32))
+        y = self.model(x, training=False)
+        # mirror the old per-request check: logits get a softmax, probabilities pass through
+        is_probs = tf.abs(tf.reduce_sum(y, axis=-1, keepdims=True) - 1.0) <= PROBS_ATOL
+        probs = tf.where(is_probs, y, tf.nn.softmax(y, axis=-1))
+        top = tf.math.top_k(probs, k=self.k)
+        return top.values, top.indices
+
+    def __call__(self, batch):
+        n = len(batch)
+        if self.jit_compile and bucket_size(n) != n:
+            padded = np.zeros((bucket_size(n),) + batch.shape[1:], dtype=np.uint8)
+            padded[:n] = batch
+            batch = padded
+        values, indices = self._fn(tf.convert_to_tensor(batch, dtype=tf.uint8))
+        return values.numpy()[:n], indices.numpy()[:n]
@@ -0,0 +1,244 @@
+# app/api/shadow.py
+"""
+Shadow evaluation: run a candidate model next to the primary one.
+
+A sampled fraction of the images the primary model actually ran on (cache
+and near-duplicate hits are skipped) is queued to a background thread. That
+thread runs the candidate in batches and appends one JSON line per image to
+CROP_SHADOW_LOG, with the candidate's forward time per image. Every
+CROP_SHADOW_SUMMARY_S seconds, and when the run stops, it also appends a
+{"summary": ...} line with the `stats()` aggregates. Responses never wait
+for the candidate, and when the queue is full, samples are dropped rather
+than delaying requests. The candidate
+still shares the CPU with the primary model, so keep the sample rate modest
+on busy servers.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.api import inference
+from app.utils.preprocessing import BatchBuffer
+
+logger = logging.getLogger(__name__)
+
+# registry version or model file path of the candidate; unset = no shadowing
+SHADOW_MODEL = os.getenv("CROP_SHADOW_MODEL")
+SHADOW_SAMPLE_RATE = float(os.getenv("CROP_SHADOW_SAMPLE_RATE", "1.0"))
+SHADOW_LOG = Path(os.getenv("CROP_SHADOW_LOG", "logs/shadow.jsonl"))
+SHADOW_QUEUE_SIZE = int(os.getenv("CROP_SHADOW_QUEUE_SIZE", "256"))
+SHADOW_MAX_BATCH = int(os.getenv("CROP_SHADOW_MAX_BATCH", "16"))
+SHADOW_SUMMARY_S = float(os.getenv("CROP_SHADOW_SUMMARY_S", "60"))
+# how long stopping waits for the batch the candidate is running
+SHADOW_STOP_TIMEOUT_S = 5.0
+
+CONFIDENCE_BINS = 10
+
+
+class ShadowEvaluator:
+    """Compares a candidate LoadedModel against whatever model served each request."""
+
+    def __init__(self, candidate, sample_rate=SHADOW_SAMPLE_RATE, log_path=SHADOW_LOG,
+                 queue_size=SHADOW_QUEUE_SIZE, max_batch=SHADOW_MAX_BATCH, summary_interval=SHADOW_SUMMARY_S):
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.log_path = Path(log_path)
+        self.max_batch = max(1, int(max_batch))
+        self.summary_interval = max(1.0, float(summary_interval))
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._buffer = BatchBuffer(self.max_batch, dtype=np.uint8)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.started_at = time.time()
+        self.sampled = 0
+        self.dropped = 0
+        self.compared = 0
+        self.agreed = 0
+        self.errors = 0
+        self.primary_conf = [0] * CONFIDENCE_BINS
+        self.candidate_conf = [0] * CONFIDENCE_BINS
+        self.primary_latency = {}  # version -> LatencyHistogram snapshot source
+        self._summarized = (time.monotonic(), 0)  # when, and at which `compared` count
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self._log = open(self.log_path, "a", buffering=1 << 16)
+        self._thread = threading.Thread(target=self._run, name="crop-shadow", daemon=True)
+        self._thread.start()
+
+    def offer(self, m, inp, result):
+        """Observer hook: sample one primary result. Never blocks."""
+        if m is self.candidate or inp is None or self._stopping.is_set():
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((inp, result, m))
+            with self._lock:
+                self.sampled += 1
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _next_batch(self):
+        # wakes up when idle so summaries keep their interval
+        try:
+            items = [self._queue.get(timeout=self.summary_interval)]
+        except queue.Empty:
+            return []
+        while len(items) < self.max_batch:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not self._stopping.is_set():
+            items = [item for item in self._next_batch() if item is not None]
+            if items and not self._stopping.is_set():
+                self._compare(items)
+            if time.monotonic() - self._summarized[0] >= self.summary_interval:
+                self._write_summary()
+            self._log.flush()
+        self._write_summary(force=True)
+        self._log.close()
+
+    def _compare(self, items):
+        try:
+            batch = self._buffer.fill([inp for inp, _, _ in items])
+            t0 = time.perf_counter()
+            values, indices = self.candidate(batch)
+            forward_ms = (time.perf_counter() - t0) * 1000.0 / len(items)
+        except Exception:
+            logger.exception("Shadow model failed")
+            with self._lock:
+                self.errors += len(items)
+            return
+        for i, (_, primary, m) in enumerate(items):
+            cand = inference.postprocess((values[i], indices[i]), self.candidate)
+            self._record(primary, m, cand, forward_ms)
+
+    def _write_summary(self, force=False):
+        # skipped while idle: nothing new since the last summary
+        stats = self.stats()
+        if force or stats["compared"] != self._summarized[1]:
+            self._log.write(json.dumps({"ts": round(time.time(), 3), "summary": stats}) + "\n")
+        self._summarized = (time.monotonic(), stats["compared"])
+
+    def _record(self, primary, m, cand, forward_ms):
+        agree = primary.get("label") == cand["label"]
+        with self._lock:
+            self.compared += 1
+            self.agreed += agree
+            self.primary_conf[min(int(primary.get("confidence", 0) * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)] += 1
+            self.candidate_conf[min(int(cand["confidence"] * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)] += 1
+            self.primary_latency[m.version] = m.latency
+        self._log.write(json.dumps({
+            "ts": round(time.time(), 3),
+            "primary_version": m.version,
+            "candidate_version": self.candidate.version,
+            "primary_label": primary.get("label"),
+            "primary_confidence": primary.get("confidence"),
+            "candidate_label": cand["label"],
+            "candidate_confidence": cand["confidence"],
+            "agree": agree,
+            "candidate_forward_ms": round(forward_ms, 3),
+        }) + "\n")
+
+    def stop(self, timeout=SHADOW_STOP_TIMEOUT_S):
+        """
+        Stop without blocking on a full queue: queued samples are dropped and
+        the worker is woken up. Waits up to `timeout` for it to write the
+        final summary; a batch still running on the candidate finishes later.
+        """
+        self._stopping.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass  # refilled by a racing offer(); the worker sees the event after its batch
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "candidate": self.candidate.version,
+                "sample_rate": self.sample_rate,
+                "log": str(self.log_path),
+                "started_at": self.started_at,
+                "sampled": self.sampled,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+                "compared": self.compared,
+                "errors": self.errors,
+                "agreement": round(self.agreed / self.compared, 4) if self.compared else None,
+                "confidence_histogram": {
+                    "bins": [round(i / CONFIDENCE_BINS, 2) for i in range(CONFIDENCE_BINS)],
+                    "primary": list(self.primary_conf),
+                    "candidate": list(self.candidate_conf),
+                },
+                "latency_per_image_ms": {
+                    "candidate": self.candidate.latency.snapshot(),
+                    **{f"primary:{v}": h.snapshot() for v, h in self.primary_latency.items()},
+                },
+            }
+
+
+_shadow = None
+_shadow_lock = threading.Lock()
+_shadow_error = None
+
+
+def start_shadow(spec, sample_rate=SHADOW_SAMPLE_RATE):
+    """Load the candidate on a background thread, then start shadowing."""
+    global _shadow_error
+    _shadow_error = None
+
+    def run():
+        global _shadow, _shadow_error
+        try:
+            ev = ShadowEvaluator(inference.load_serving_model(spec), sample_rate=sample_rate)
+        except Exception as e:
+            _shadow_error = f"{spec}: {e}"
+            logger.exception("Could not start shadow model %s", spec)
+            return
+        with _shadow_lock:
+            old, _shadow = _shadow, ev
+        if old is not None:
+            inference.remove_observer(old.offer)
+            old.stop()
+        inference.add_observer(ev.offer)
+        logger.info("Shadowing %s at sample rate %.2f", ev.candidate.version, sample_rate)
+
+    threading.Thread(target=run, name="crop-shadow-loader", daemon=True).start()
+
+
+def stop_shadow():
+    global _shadow
+    with _shadow_lock:
+        old, _shadow = _shadow, None
+    if old is not None:
+        inference.remove_observer(old.offer)
+        old.stop()
+        return old.stats()
+    return None
+
+
+def start_from_env():
+    if SHADOW_MODEL:
+        start_shadow(SHADOW_MODEL, SHADOW_SAMPLE_RATE)
+
+
+def shadow_status():
+    ev = _shadow
+    return {"active": ev.stats() if ev is not None else None, "error": _shadow_error}
@@ -0,0 +1,228 @@
+# app/api/stream.py
+"""
+Continuous diagnosis over a WebSocket (`/ws/predict`).
+
+The client sends JPEG frames as binary messages. Each connection keeps at
+most CROP_STREAM_MAX_PENDING frames waiting. When inference falls behind,
+the oldest waiting frame is dropped, so the answers keep up with the camera
+instead of lagging further and further behind. All frames waiting when the
+previous round finishes go to the batcher together. Per-frame top-k
+probabilities are averaged over the last CROP_STREAM_WINDOW frames before
+a label is emitted. One JSON message is sent per processed frame:
+
+    {"frame": 17, "label": ..., "confidence": ..., "causes": [...],
+     "suggestions": [...], "frame_label": ..., "frame_confidence": ...,
+     "latency_ms": 41.2, "dropped": 3, "model_version": ...}
+
+`frame` counts the binary messages received on the connection, so a client
+can match answers to the frames it sent. `latency_ms` runs from receipt to
+reply, and `dropped` is the connection's running total.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import inference
+from app.api.executor import ExecutorSaturated, inference_pool
+from app.api.metrics import metrics
+from app.api.timing import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+STREAM_WINDOW = int(os.getenv("CROP_STREAM_WINDOW", "5"))
+STREAM_MAX_PENDING = int(os.getenv("CROP_STREAM_MAX_PENDING", "2"))
+STREAM_MAX_FRAME_BYTES = int(os.getenv("CROP_STREAM_MAX_FRAME_BYTES", str(8 << 20)))
+
+
+class StreamStats:
+    """Counters shared by all WebSocket streams, reported in /stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        # receipt to reply, per frame
+        self.latency = LatencyHistogram()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def snapshot(self):
+        with self._lock:
+            received = self.received
+            return {
+                "active": self.active,
+                "received": received,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "drop_rate": round(self.dropped / received, 4) if received else None,
+                "latency_ms": self.latency.snapshot(),
+            }
+
+
+stream_stats = StreamStats()
+
+
+class SlidingWindowSmoother:
+    """Averages sparse top-k probability rows over the last `window` frames."""
+
+    def __init__(self, window=STREAM_WINDOW):
+        self.window = max(1, int(window))
+        self._rows = deque()
+        self._sum = None
+
+    def reset(self):
+        self._rows.clear()
+        self._sum = None
+
+    def update(self, values, indices, num_classes):
+        """Add one frame; returns (values, indices) of the smoothed top-k."""
+        if self._sum is None or len(self._sum) != num_classes:
+            self.reset()
+            self._sum = np.zeros(num_classes, dtype=np.float64)
+        row = np.zeros(num_classes, dtype=np.float64)
+        row[np.asarray(indices)] = values
+        self._rows.append(row)
+        self._sum += row
+        if len(self._rows) > self.window:
+            self._sum -= self._rows.popleft()
+        mean = self._sum / len(self._rows)
+        top = np.argsort(mean)[::-1][:len(indices)]
+        return mean[top], top
+
+
+def _run_frames(frames):
+    """Decode and predict a list of frames; one (model, preds or exception) each."""
+    with inference.use_model() as m:
+        pending = []
+        for fut in inference.decode_many(frames):
+            try:
+                pending.append(m.submit(fut.result()))
+            except Exception as e:
+                pending.append(e)
+        out = []
+        for item in pending:
+            if isinstance(item, Exception):
+                out.append(item)
+                continue
+            try:
+                out.append(item.result())
+            except Exception as e:
+                out.append(e)
+        return m, out
+
+
+class FrameStream:
+    """One WebSocket connection: a receive task feeding a predict loop."""
+
+    def __init__(self, ws, window=STREAM_WINDOW, max_pending=STREAM_MAX_PENDING):
+        self.ws = ws
+        self.max_pending = max(1, int(max_pending))
+        self.smoother = SlidingWindowSmoother(window)
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self._version = None
+        self.seq = 0
+        self.dropped = 0
+
+    def _drop(self, n):
+        self.dropped += n
+        stream_stats.add(dropped=n)
+
+    async def _receive(self):
+        try:
+            while True:
+                msg = await self.ws.receive()
+                if msg["type"] == "websocket.disconnect":
+                    break
+                data = msg.get("bytes")
+                if data is None:
+                    continue  # text messages are ignored
+                self.seq += 1
+                stream_stats.add(received=1)
+                if len(data) > STREAM_MAX_FRAME_BYTES:
+                    self._drop(1)
+                    continue
+                if len(self._pending) >= self.max_pending:
+                    self._pending.popleft()
+                    self._drop(1)
+                self._pending.append((self.seq, time.perf_counter(), data))
+                self._wakeup.set()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._closed = True
+            self._wakeup.set()
+
+    async def _process(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._closed:
+                return
+            if not self._pending:
+                continue
+            frames = list(self._pending)
+            self._pending.clear()
+            try:
+                fut = inference_pool.submit(_run_frames, [data for _, _, data in frames])
+            except ExecutorSaturated:
+                # the server is busy with other work; these frames are stale anyway
+                self._drop(len(frames))
+                continue
+            try:
+                m, preds = await asyncio.wrap_future(fut)
+            except inference.ModelNotReady as e:
+                self._drop(len(frames))
+                await self.ws.send_json({"error": str(e), "dropped": self.dropped})
+                continue
+            for (seq, t0, _), pred in zip(frames, preds):
+                await self.ws.send_json(self._reply(m, seq, t0, pred))
+
+    def _reply(self, m, seq, t0, pred):
+        if isinstance(pred, Exception):
+            stream_stats.add(errors=1)
+            return {"frame": seq, "error": str(pred), "dropped": self.dropped}
+        m = inference.answered_by(pred, m)
+        if m.version != self._version:
+            self.smoother.reset()  # do not average across model versions
+            self._version = m.version
+        values, indices = pred
+        frame = inference.postprocess(pred, m)
+        result = inference.postprocess(self.smoother.update(values, indices, len(m.class_names)), m)
+        ms = (time.perf_counter() - t0) * 1000.0
+        stream_stats.add(processed=1)
+        metrics.count_label(result["label"])
+        stream_stats.latency.observe(ms)
+        return {
+            "frame": seq,
+            **result,
+            "frame_label": frame["label"],
+            "frame_confidence": frame["confidence"],
+            "latency_ms": round(ms, 1),
+            "dropped": self.dropped,
+        }
+
+    async def run(self):
+        stream_stats.add(active=1)
+        receiver = asyncio.create_task(self._receive())
+        try:
+            await self._process()
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # the client went away while we were replying
+        finally:
+            receiver.cancel()
+            stream_stats.add(active=-1)
@@ -0,0 +1,51 @@
+# app/api/timing.py
+import bisect
+import threading
+
+# upper bounds in milliseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket histogram of durations in milliseconds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, ms, n=1):
+        """Record `n` observations of `ms` (e.g. a batch amortized per image)."""
+        i = bisect.bisect_left(self.buckets, ms)
+        with self._lock:
+            self._counts[i] += n
+            self._sum += ms * n
+            self._count += n
+
+    def quantile(self, q):
+        """Approximate quantile: upper bound of the bucket holding it."""
+        with self._lock:
+            if not self._count:
+                return None
+            target = q * self._count
+            seen = 0
+            for bound, c in zip(self.buckets, self._counts):
+                seen += c
+                if seen >= target:
+                    return bound
+        return self.buckets[-1]
+
+    def totals(self):
+        """(bucket bounds, per-bucket counts, sum, count), read atomically."""
+        with self._lock:
+            return self.buckets, list(self._counts), self._sum, self._count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self._count,
+                "mean_ms": round(self._sum / self._count, 3) if self._count else None,
+                "buckets": {str(b): c for b, c in zip(self.buckets, self._counts)},
+            }
@@ -0,0 +1,350 @@
+# app/api/uploads.py
+import hashlib
+import io
+import mmap
+import os
+import tarfile
+import tempfile
+import zipfile
+from pathlib import PurePosixPath
+
+from PIL import Image
+
+from app.utils.image_io import MAX_IMAGE_PIXELS, ImageTooLarge, as_file
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+# limits for /predict/batch (counted after archives are expanded)
+BATCH_MAX_FILES = int(os.getenv("CROP_BATCH_MAX_FILES", "256"))
+BATCH_MAX_BYTES = int(os.getenv("CROP_BATCH_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# uploads are streamed, not buffered by the framework
+MAX_UPLOAD_BYTES = int(os.getenv("CROP_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# bodies larger than this spill from memory to an unlinked temp file
+UPLOAD_SPOOL_BYTES = int(os.getenv("CROP_UPLOAD_SPOOL_BYTES", str(4 * 1024 * 1024)))
+# give up the early dimension check if the header is not parsed by then
+SNIFF_MAX_BYTES = 512 * 1024
+# multipart boundaries and part headers on top of each file
+MULTIPART_OVERHEAD = 16 * 1024
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+IMAGE_MAGIC = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"BM", b"II*\x00", b"MM\x00*")
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured file or byte limits."""
+
+
+class NotAnImage(ValueError):
+    """Raised when an upload does not start like any supported image format."""
+
+
+def sniff_image(head):
+    """True if `head` (the first bytes of a file) looks like a supported image."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return True
+    return any(head.startswith(magic) for magic in IMAGE_MAGIC)
+
+
+class StreamedUpload:
+    """
+    One image received in chunks. The size is capped, and a sha256 is kept
+    as the data arrives. The header is checked as soon as enough of it is in.
+    Non-images and images declaring more than MAX_IMAGE_PIXELS are rejected
+    before the rest of the body is read. The data stays in memory up to
+    `spool_bytes` and then moves to an unlinked temp file. `payload()` hands
+    it to the decoder as a buffer (an mmap once spilled), so the body is
+    never duplicated into a `bytes` object. With `sniff=False` (batch parts,
+    which may be archives) the header is not checked.
+    """
+
+    def __init__(self, max_bytes=MAX_UPLOAD_BYTES, spool_bytes=UPLOAD_SPOOL_BYTES, max_pixels=MAX_IMAGE_PIXELS,
+                 sniff=True):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.max_pixels = max_pixels
+        self.size = 0
+        self.filename = None
+        self._sha256 = hashlib.sha256()
+        self._mem = io.BytesIO()
+        self._disk = None
+        self._map = None
+        self._checked = not sniff
+
+    @property
+    def digest(self):
+        return self._sha256.hexdigest()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._sha256.update(chunk)
+        if self._disk is not None:
+            self._disk.write(chunk)
+            return
+        self._mem.write(chunk)
+        if not self._checked:
+            self._check_header(final=False)
+        if self.size > self.spool_bytes:
+            self._disk = tempfile.TemporaryFile(prefix="crop-upload-")
+            self._disk.write(self._mem.getbuffer())
+            self._mem = None
+
+    def _check_header(self, final):
+        head = self._mem.getbuffer()
+        try:
+            if len(head) < 12 and not final:
+                return
+            if not sniff_image(bytes(head[:12])):
+                raise NotAnImage("Upload is not a supported image (JPEG, PNG, WebP, BMP, GIF or TIFF)")
+            try:
+                with Image.open(io.BytesIO(head)) as probe:  # parses the header only
+                    w, h = probe.size
+            except Image.DecompressionBombError as e:
+                raise ImageTooLarge(str(e))
+            except Exception:
+                # header not complete yet; the decoder checks again in any case
+                if final or len(head) >= SNIFF_MAX_BYTES:
+                    self._checked = True
+                return
+            if w * h > self.max_pixels:
+                raise ImageTooLarge(f"Image is {w}x{h} pixels (limit {self.max_pixels})")
+            self._checked = True
+        finally:
+            head.release()
+
+    def finish(self):
+        if self.size == 0:
+            raise ValueError("No file provided")
+        if not self._checked and self._mem is not None:
+            self._check_header(final=True)
+
+    def payload(self):
+        """The received bytes as a buffer: a memoryview in memory, an mmap once spilled."""
+        if self._disk is None:
+            return self._mem.getbuffer()
+        self._disk.flush()
+        self._map = mmap.mmap(self._disk.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        for f in (self._map, self._disk):
+            try:
+                if f is not None:
+                    f.close()
+            except BufferError:
+                pass  # a decoder still holds a view; freed with it
+        self._mem = None
+
+
+async def receive_image(request, field="file", max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Stream the image of `request` into a StreamedUpload: the `field` part of
+    a multipart form, or the whole body when it is sent as `image/*` or
+    `application/octet-stream`. Raises UploadTooLarge, ImageTooLarge or
+    NotAnImage as soon as the data read so far shows the problem, and
+    ValueError for a request without an image.
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+    content_type = request.headers.get("content-type", "")
+    upload = StreamedUpload(max_bytes)
+
+    def open_first(filename):
+        # only the first part with the expected name is read
+        if upload.filename is not None or upload.size:
+            return None
+        upload.filename = filename or ""
+        return upload
+
+    try:
+        if content_type.startswith("multipart/form-data"):
+            parser = _FormParser(content_type, field, open_first, max_bytes + MULTIPART_OVERHEAD, max_bytes)
+            async for chunk in request.stream():
+                parser.write(chunk)
+            parser.finalize()
+        elif content_type.startswith(("image/", "application/octet-stream")):
+            async for chunk in request.stream():
+                upload.write(chunk)
+        else:
+            raise ValueError("Send the image as a multipart `file` field or as an image/* body")
+        upload.finish()
+    except BaseException:
+        upload.close()
+        raise
+    return upload
+
+
+async def receive_files(request, field="files", max_files=BATCH_MAX_FILES, max_bytes=BATCH_MAX_BYTES):
+    """
+    Stream every `field` part of a multipart request into its own
+    StreamedUpload, in upload order. Parts are not sniffed, since they may be
+    archives, and spill to disk like single images do. Raises UploadTooLarge
+    past `max_files` parts or once the body exceeds `max_bytes` (plus
+    multipart framing); the caller closes the returned uploads.
+    """
+    length = request.headers.get("content-length")
+    max_body = max_bytes + MULTIPART_OVERHEAD * max_files
+    if length and length.isdigit() and int(length) > max_body:
+        raise UploadTooLarge(f"Batch exceeds {max_bytes} bytes")
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise ValueError("Send the images as multipart `files` fields")
+    uploads = []
+
+    def open_part(filename):
+        if len(uploads) >= max_files:
+            raise UploadTooLarge(f"Too many files in batch (limit {max_files})")
+        upload = StreamedUpload(max_bytes, sniff=False)
+        upload.filename = filename or ""
+        uploads.append(upload)
+        return upload
+
+    try:
+        parser = _FormParser(content_type, field, open_part, max_body, max_bytes)
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except BaseException:
+        for upload in uploads:
+            upload.close()
+        raise
+    return uploads
+
+
+class _FormParser:
+    # feeds each `field` part of a multipart body to the StreamedUpload that
+    # `open_part(filename)` returns (None skips the part); other fields are skipped
+
+    def __init__(self, content_type, field, open_part, max_body, max_bytes):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("Multipart body without a boundary")
+        self.field = field.encode()
+        self.open_part = open_part
+        self.max_body = max_body
+        self.max_bytes = max_bytes
+        self.received = 0
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._upload = None
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def write(self, chunk):
+        self.received += len(chunk)
+        if self.received > self.max_body:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._parser.write(chunk)
+
+    def finalize(self):
+        self._parser.finalize()
+
+    def _on_part_begin(self):
+        self._disposition = b""
+        self._upload = None
+
+    def _on_header_field(self, data, start, end):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") == self.field:
+            filename = options.get(b"filename")
+            self._upload = self.open_part(filename.decode("utf-8", "replace") if filename is not None else None)
+
+    def _on_part_data(self, data, start, end):
+        if self._upload is not None:
+            self._upload.write(data[start:end])
+
+    def _on_part_end(self):
+        self._upload = None
+
+
+def _is_image_member(name):
+    p = PurePosixPath(name)
+    # skip hidden files and macOS resource forks (__MACOSX/._foo.jpg)
+    if any(part.startswith(".") or part == "__MACOSX" for part in p.parts):
+        return False
+    return p.suffix.lower() in IMAGE_SUFFIXES
+
+
+def _iter_zip(data):
+    with zipfile.ZipFile(as_file(data)) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _is_image_member(info.filename):
+                continue
+            # check the declared size before inflating anything
+            yield info.filename, info.file_size, lambda info=info: zf.read(info)
+
+
+def _iter_tar(data):
+    with tarfile.open(fileobj=as_file(data), mode="r:*") as tf:
+        for member in tf:
+            if not member.isfile() or not _is_image_member(member.name):
+                continue
+            yield member.name, member.size, lambda member=member: tf.extractfile(member).read()
+
+
+def _archive_iter(filename, data):
+    if data[:4] == b"PK\x03\x04":
+        return _iter_zip(data)
+    if (filename or "").lower().endswith(TAR_SUFFIXES):
+        return _iter_tar(data)
+    return None
+
+
+def expand_uploads(items, max_files=BATCH_MAX_FILES, max_bytes=BATCH_MAX_BYTES):
+    """
+    Flatten uploaded (filename, data) pairs into image (filename, data) pairs;
+    `data` is bytes or a buffer such as `StreamedUpload.payload()`. Zip and
+    tar archives are expanded in member order, read through the buffer
+    without copying it; plain files pass through untouched. Raises UploadTooLarge when the expanded batch has more
+    than `max_files` images or more than `max_bytes` in total.
+    """
+    out = []
+    total = 0
+
+    def add(name, size, read):
+        nonlocal total
+        if len(out) >= max_files:
+            raise UploadTooLarge(f"Too many images in batch (limit {max_files})")
+        total += size
+        if total > max_bytes:
+            raise UploadTooLarge(f"Batch exceeds {max_bytes} bytes")
+        out.append((name, read()))
+
+    for filename, data in items:
+        members = _archive_iter(filename, data)
+        if members is None:
+            add(filename, len(data), lambda data=data: data)
+            continue
+        try:
+            for name, size, read in members:
+                add(f"{filename}/{name}", size, read)
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            raise ValueError(f"Could not read archive {filename}: {e}")
+    return out
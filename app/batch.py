@@ -0,0 +1,221 @@
+# app/batch.py
+"""
+Score a directory or manifest of leaf images offline.
+
+    python -m app.batch data/archive --out scores.jsonl
+    python -m app.batch --manifest files.txt --out scores/ --format parquet
+
+Files stream through a tf.data pipeline. Parallel decode and resize use the
+same code as the HTTP path, then images are batched and prefetched so the
+model never waits for decode. Results are written as they arrive. JSONL is
+appended and flushed after every batch. Parquet is written as numbered part
+files into an output directory (needs pyarrow); a part is closed every
+--rows-per-part rows or --flush-every seconds, whichever comes first, so a
+killed run loses at most that much work. Re-running the same command
+skips every image already present in the output, so an interrupted run
+resumes where it stopped. Throughput in images/sec is printed to stderr.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from app.api import inference
+from app.api.uploads import IMAGE_SUFFIXES
+from app.utils.preprocessing import IMG_SIZE
+
+
+def list_inputs(source=None, manifest=None):
+    """Image paths in a stable order: a manifest (one path per line) or a directory walk."""
+    if manifest:
+        # relative entries are resolved against the manifest's directory
+        base = Path(manifest).parent
+        lines = (line.strip() for line in Path(manifest).read_text().splitlines())
+        return [str(base / line) for line in lines if line and not line.startswith("#")]
+    return sorted(str(p) for p in Path(source).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def _load(path):
+    # same decode (JPEG draft mode, EXIF) and resize as predict_from_bytes
+    try:
+        with open(path.decode(), "rb") as fh:
+            return inference.load_input(fh.read()), True
+    except Exception:
+        return np.zeros((IMG_SIZE[1], IMG_SIZE[0], 3), dtype=np.uint8), False
+
+
+def make_dataset(paths, batch_size, parallel=tf.data.AUTOTUNE):
+    """(paths, images, ok) batches: decode -> resize -> batch -> prefetch."""
+    ds = tf.data.Dataset.from_tensor_slices(paths)
+
+    def load(path):
+        img, ok = tf.numpy_function(_load, [path], [tf.uint8, tf.bool])
+        img.set_shape((IMG_SIZE[1], IMG_SIZE[0], 3))
+        ok.set_shape(())
+        return path, img, ok
+
+    # order is not needed: every row carries its own path
+    return (ds.map(load, num_parallel_calls=parallel, deterministic=False)
+              .batch(batch_size)
+              .prefetch(tf.data.AUTOTUNE))
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = None
+
+    def done(self):
+        """Paths already scored; drops a half-written last line from a killed run."""
+        if not self.path.exists():
+            return set()
+        raw = self.path.read_bytes()
+        keep = raw[:raw.rfind(b"\n") + 1]
+        if len(keep) != len(raw):
+            self.path.write_bytes(keep)
+        return {json.loads(line)["path"] for line in keep.splitlines() if line.strip()}
+
+    def write(self, rows):
+        if self._fh is None:
+            self._fh = open(self.path, "a")
+        for row in rows:
+            self._fh.write(json.dumps(row) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+
+
+class ParquetWriter:
+    """
+    Numbered part files; a part is only renamed into place once complete.
+    Rows still buffered when the process is killed are scored again on the
+    next run, so a part is written at least every `flush_every` seconds.
+    """
+
+    def __init__(self, path, rows_per_part=10000, flush_every=30.0):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.rows_per_part = rows_per_part
+        self.flush_every = flush_every
+        self._rows = []
+        self._flushed = time.monotonic()
+
+    def _parts(self):
+        return sorted(self.dir.glob("part-*.parquet"))
+
+    def done(self):
+        import pyarrow.parquet as pq
+        seen = set()
+        for part in self._parts():
+            seen.update(pq.read_table(part, columns=["path"]).column("path").to_pylist())
+        return seen
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= self.rows_per_part or time.monotonic() - self._flushed >= self.flush_every:
+            self._flush()
+
+    def _flush(self):
+        self._flushed = time.monotonic()
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        parts = self._parts()
+        n = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+        target = self.dir / f"part-{n:05d}.parquet"
+        tmp = target.with_suffix(".tmp")
+        rows = [dict(r, top_k=json.dumps(r["top_k"])) for r in self._rows]
+        pq.write_table(pa.Table.from_pylist(rows), tmp)
+        tmp.replace(target)
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def _rows(m, paths, ok, values, indices):
+    out = []
+    for i, path in enumerate(paths):
+        path = path.decode()
+        if not ok[i]:
+            out.append({"path": path, "label": None, "confidence": None, "top_k": [],
+                        "model_version": m.version, "error": "could not decode image"})
+            continue
+        res = inference.postprocess((values[i], indices[i]), m)
+        out.append({
+            "path": path,
+            "label": res["label"],
+            "confidence": res["confidence"],
+            "top_k": [[m.class_names[int(j)], round(float(v), 4)] for v, j in zip(values[i], indices[i])],
+            "model_version": m.version,
+            "error": None,
+        })
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("source", nargs="?", help="directory of images (searched recursively)")
+    ap.add_argument("--manifest", help="text file with one image path per line")
+    ap.add_argument("--out", required=True, help="JSONL file, or directory for --format parquet")
+    ap.add_argument("--format", choices=("jsonl", "parquet"), default=None,
+                    help="defaults to parquet when --out ends in / or .parquet, else jsonl")
+    ap.add_argument("--model", help="registry version or model file (defaults to the serving model)")
+    ap.add_argument("--batch-size", type=int, default=64)
+    ap.add_argument("--rows-per-part", type=int, default=10000, help="max parquet rows per part file")
+    ap.add_argument("--flush-every", type=float, default=30.0,
+                    help="seconds between parquet parts at most; rows not yet in a part are lost "
+                         "(and re-scored on resume) if the run is killed")
+    ap.add_argument("--progress-every", type=float, default=10.0, help="seconds between progress lines")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if not args.source and not args.manifest:
+        ap.error("give a source directory or --manifest")
+
+    fmt = args.format or ("parquet" if args.out.endswith(("/", ".parquet")) else "jsonl")
+    writer = ParquetWriter(args.out, args.rows_per_part, args.flush_every) if fmt == "parquet" else JsonlWriter(args.out)
+
+    paths = list_inputs(args.source, args.manifest)
+    done = writer.done()
+    todo = [p for p in paths if p not in done]
+    print(f"{len(paths)} images, {len(done)} already scored, {len(todo)} to go", file=sys.stderr)
+    if not todo:
+        return
+
+    m = inference.load_serving_model(args.model)
+    print(f"Model {m.version} ({m.runtime.kind})", file=sys.stderr)
+
+    t0 = last = time.perf_counter()
+    count = last_count = 0
+    try:
+        for batch_paths, images, ok in make_dataset(todo, args.batch_size):
+            values, indices = m(images.numpy())
+            writer.write(_rows(m, batch_paths.numpy(), ok.numpy(), values, indices))
+            count += len(batch_paths)
+            now = time.perf_counter()
+            if now - last >= args.progress_every:
+                print(f"{count}/{len(todo)}  {(count - last_count) / (now - last):.1f} img/s "
+                      f"(avg {count / (now - t0):.1f})", file=sys.stderr)
+                last, last_count = now, count
+    finally:
+        writer.close()
+        elapsed = time.perf_counter() - t0
+        print(f"Scored {count} images in {elapsed:.1f}s: {count / max(elapsed, 1e-9):.1f} img/s",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
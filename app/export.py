@@ -0,0 +1,157 @@
+# app/export.py
+"""
+Convert the Keras model into TFLite artifacts and report accuracy deltas.
+
+    python -m app.export --calibration-dir data/calib --eval-dir data/val
+
+Writes <stem>_<variant>.tflite for each requested variant plus report.json
+into --out-dir. Variants:
+  float32  plain conversion
+  dynamic  dynamic-range quantization (int8 weights, float activations)
+  float16  float16 weights
+  int8     full-integer quantization calibrated on --calibration-dir
+           (uint8 input, float32 output)
+
+--eval-dir may contain one sub-directory per class (named as in CLASS_NAMES)
+for top-1 accuracy; otherwise agreement with the Keras model is reported on
+the calibration images.
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from app.api.inference import MODEL_PATH, load_model
+from app.api.runtime import KerasRuntime, TFLiteRuntime
+from app.api.uploads import IMAGE_SUFFIXES
+from app.utils.image_io import decode_image
+from app.utils.labels import CLASS_NAMES
+from app.utils.preprocessing import IMG_SIZE, resize_image
+
+VARIANTS = ("float32", "dynamic", "float16", "int8")
+
+
+def _list_images(root):
+    return sorted(p for p in Path(root).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def _load_images(paths):
+    return np.stack([resize_image(decode_image(p.read_bytes(), target_size=IMG_SIZE)) for p in paths])
+
+
+def convert(model, variant, calibration=None):
+    # keeps the model's dynamic batch dim, so the interpreter can be resized
+    conv = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant == "dynamic":
+        conv.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif variant == "float16":
+        conv.optimizations = [tf.lite.Optimize.DEFAULT]
+        conv.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        if calibration is None or not len(calibration):
+            raise ValueError("int8 export needs --calibration-dir images")
+
+        def representative():
+            for img in calibration:
+                yield [img[None].astype(np.float32)]
+
+        conv.optimizations = [tf.lite.Optimize.DEFAULT]
+        conv.representative_dataset = representative
+        conv.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        conv.inference_input_type = tf.uint8
+    elif variant != "float32":
+        raise ValueError(f"Unknown variant: {variant}")
+    return conv.convert()
+
+
+def _evaluate(runtime, images, batch_size):
+    labels, confs, times = [], [], []
+    for i in range(0, len(images), batch_size):
+        batch = images[i:i + batch_size]
+        t0 = time.perf_counter()
+        values, indices = runtime(batch)
+        times.append((time.perf_counter() - t0) / len(batch))
+        labels.append(indices[:, 0])
+        confs.append(values[:, 0])
+    return np.concatenate(labels), np.concatenate(confs), 1000.0 * float(np.median(times))
+
+
+def _report_row(name, size, labels, confs, ms, ref_labels, ref_confs, truth):
+    row = {
+        "variant": name,
+        "size_mb": round(size / 1e6, 2),
+        "ms_per_image": round(ms, 2),
+        "agreement": round(float(np.mean(labels == ref_labels)), 4),
+        "mean_abs_conf_delta": round(float(np.mean(np.abs(confs - ref_confs))), 4),
+    }
+    if truth is not None:
+        row["top1_accuracy"] = round(float(np.mean(labels == truth)), 4)
+    return row
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", default=str(MODEL_PATH), help="Keras model to convert")
+    ap.add_argument("--out-dir", default=None, help="defaults to <model dir>/tflite")
+    ap.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    ap.add_argument("--calibration-dir", help="representative images for int8 calibration")
+    ap.add_argument("--calibration-limit", type=int, default=200)
+    ap.add_argument("--eval-dir", help="labelled images (one sub-directory per class)")
+    ap.add_argument("--eval-limit", type=int, default=2000)
+    ap.add_argument("--batch-size", type=int, default=16)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    model_path = Path(args.model)
+    out_dir = Path(args.out_dir) if args.out_dir else model_path.parent / "tflite"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model = load_model(model_path)
+
+    calibration = None
+    if args.calibration_dir:
+        calibration = _load_images(_list_images(args.calibration_dir)[:args.calibration_limit])
+        print(f"Loaded {len(calibration)} calibration images")
+
+    truth = None
+    if args.eval_dir:
+        paths = _list_images(args.eval_dir)[:args.eval_limit]
+        class_index = {name: i for i, name in enumerate(CLASS_NAMES)}
+        paths = [p for p in paths if p.parent.name in class_index]
+        truth = np.array([class_index[p.parent.name] for p in paths])
+        eval_images = _load_images(paths)
+    elif calibration is not None:
+        eval_images = calibration
+    else:
+        raise SystemExit("Need --eval-dir or --calibration-dir to measure accuracy deltas")
+    print(f"Evaluating on {len(eval_images)} images")
+
+    ref_labels, ref_confs, ref_ms = _evaluate(KerasRuntime(model, k=1), eval_images, args.batch_size)
+    rows = [_report_row("keras", model_path.stat().st_size, ref_labels, ref_confs, ref_ms,
+                        ref_labels, ref_confs, truth)]
+
+    for variant in args.variants:
+        t0 = time.perf_counter()
+        blob = convert(model, variant, calibration)
+        path = out_dir / f"{model_path.stem}_{variant}.tflite"
+        path.write_bytes(blob)
+        labels, confs, ms = _evaluate(TFLiteRuntime(path, k=1), eval_images, args.batch_size)
+        row = _report_row(variant, len(blob), labels, confs, ms, ref_labels, ref_confs, truth)
+        row["path"] = str(path)
+        row["convert_s"] = round(time.perf_counter() - t0, 1)
+        rows.append(row)
+        print(json.dumps(row))
+
+    (out_dir / "report.json").write_text(json.dumps(rows, indent=2))
+    print(f"\n{'variant':<10}{'MB':>9}{'ms/img':>9}{'agree':>8}{'|dconf|':>9}{'top1':>8}")
+    for r in rows:
+        top1 = f"{r['top1_accuracy']:.4f}" if "top1_accuracy" in r else "-"
+        print(f"{r['variant']:<10}{r['size_mb']:>9}{r['ms_per_image']:>9}{r['agreement']:>8}"
+              f"{r['mean_abs_conf_delta']:>9}{top1:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# app/serve.py
+"""
+Serve the API from several HTTP workers that share one model.
+
+    python -m app.serve --workers 4 --host 0.0.0.0 --port 8000
+
+One inference process loads the model and runs the micro-batcher. The
+--workers front-end processes accept connections on a shared socket, decode
+and resize uploads, and hand the pixels over through shared memory
+(app.api.ipc). RSS therefore grows by one interpreter per worker, not by
+one model per worker.
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import signal
+import socket
+
+from app.api.inference import BATCH_MAX_SIZE
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("CROP_WORKERS", str(min(4, os.cpu_count() or 1))))
+# images each front-end can have in flight; the rest wait for a free slot
+SLOTS_PER_WORKER = int(os.getenv("CROP_IPC_SLOTS_PER_WORKER", str(2 * BATCH_MAX_SIZE)))
+
+
+def _run_inference(arena_name, num_slots, requests, responses):
+    from app.api import ipc
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent shuts us down
+    logging.basicConfig(level=logging.INFO)
+    ipc.serve_inference(arena_name, num_slots, requests, responses)
+
+
+def _run_frontend(worker_id, sock, arena_name, num_slots, slots, requests, response, log_level):
+    import uvicorn
+
+    from app.api import inference, ipc
+
+    arena = ipc.SlotArena(num_slots, name=arena_name)
+    client = ipc.InferenceClient(worker_id, arena, slots, requests, response)
+    inference.use_remote(ipc.RemoteModel(client))
+    config = uvicorn.Config("app.api.routes:app", log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--slots-per-worker", type=int, default=SLOTS_PER_WORKER)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app.api import ipc
+
+    # spawn: the children must not inherit a forked TensorFlow runtime
+    ctx = mp.get_context("spawn")
+    num_slots = args.workers * args.slots_per_worker
+    arena = ipc.SlotArena(num_slots, create=True)
+    requests = ctx.Queue()
+    # replies and model status pushes, one queue per front-end
+    responses = [ctx.Queue() for _ in range(args.workers)]
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.set_inheritable(True)
+
+    procs = [ctx.Process(target=_run_inference, name="crop-inference",
+                         args=(arena.name, num_slots, requests, responses))]
+    for w in range(args.workers):
+        slots = range(w * args.slots_per_worker, (w + 1) * args.slots_per_worker)
+        procs.append(ctx.Process(target=_run_frontend, name=f"crop-http-{w}",
+                                 args=(w, sock, arena.name, num_slots, slots, requests, responses[w],
+                                       args.log_level)))
+    for p in procs:
+        p.start()
+    logger.info("Serving on http://%s:%d with %d workers and %d shared slots",
+                args.host, args.port, args.workers, num_slots)
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        # any child exiting takes the whole server down
+        mp.connection.wait([p.sentinel for p in procs])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # a second ^C must not skip the cleanup below
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        for p in procs:
+            p.join(10)
+        sock.close()
+        arena.close()
+        arena.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +0,0 @@
-import logging
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-logger.info("Package 'ui' initialized")
\ No newline at end of file
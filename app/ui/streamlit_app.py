@@ -4,15 +4,30 @@ import subprocess
 import sys
 import time
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
+from PIL import Image, ImageOps
 import io
+import os
 
 st.set_page_config(page_title="CropGuardianAI", layout="centered")
 
 API_HOST = "127.0.0.1"
 API_PORT = 8000
+API_WORKERS = int(os.getenv("CROP_WORKERS", "1"))
 API_URL = f"http://{API_HOST}:{API_PORT}/predict"
+BATCH_URL = f"http://{API_HOST}:{API_PORT}/predict/batch"
 HEALTH_URL = f"http://{API_HOST}:{API_PORT}/healthz"
+READY_URL = f"http://{API_HOST}:{API_PORT}/readyz"
+# (connect, read) seconds
+REQUEST_TIMEOUT = (3.05, 30)
+# backend health is probed at most once per this many seconds, whatever the rerun rate
+HEALTH_TTL_S = float(os.getenv("CROP_UI_HEALTH_TTL_S", "3"))
+# uploads are downscaled to this longest side (2x the 224px model input) and re-encoded
+UPLOAD_MAX_SIDE = int(os.getenv("CROP_UI_UPLOAD_MAX_SIDE", "448"))
+UPLOAD_JPEG_QUALITY = 90
+# images per /predict/batch request when several files are analyzed
+BATCH_CHUNK = int(os.getenv("CROP_UI_BATCH_CHUNK", "16"))
 
 LOG_DIR = Path.cwd() / "logs"
 LOG_DIR.mkdir(exist_ok=True)
@@ -36,9 +51,46 @@ st.markdown(
 )
 
 # --- session state defaults ---
-for k in ("uvicorn_proc", "uvicorn_log", "prediction_result"):
+for k in ("uvicorn_proc", "uvicorn_log", "prediction_result", "batch_results"):
     st.session_state.setdefault(k, None)
 
+@st.cache_resource
+def http_session():
+    # one keep-alive connection pool for every rerun and browser session
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=HEALTH_TTL_S, show_spinner=False)
+def backend_health():
+    try:
+        return http_session().get(HEALTH_URL, timeout=0.8).status_code == 200
+    except requests.RequestException:
+        return False
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def prepare_upload(name, data):
+    """
+    Downscale an image to UPLOAD_MAX_SIDE and re-encode it as JPEG; the model
+    only sees 224x224, so the full-resolution photo is wasted bandwidth.
+    Small JPEGs are sent as they are. Returns (filename, bytes, mime type).
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format == "JPEG" and max(img.size) <= UPLOAD_MAX_SIDE:
+            return name, data, "image/jpeg"
+        # JPEG draft mode decodes straight at a reduced scale
+        img.draft("RGB", (UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((UPLOAD_MAX_SIDE, UPLOAD_MAX_SIDE), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=UPLOAD_JPEG_QUALITY)
+    except Exception:
+        return name, data, None  # let the backend report what is wrong with it
+    return Path(name).stem + ".jpg", buf.getvalue(), "image/jpeg"
+
 def start_backend():
     logfile = LOG_DIR / f"uvicorn_{int(time.time())}.log"
     fh = open(logfile, "ab")
@@ -47,9 +99,17 @@ def start_backend():
         "app.api.routes:app",
         "--host", API_HOST, "--port", str(API_PORT)
     ]
+    if API_WORKERS > 1:
+        # one inference process shared by several HTTP workers
+        cmd = [
+            sys.executable, "-m", "app.serve",
+            "--workers", str(API_WORKERS),
+            "--host", API_HOST, "--port", str(API_PORT)
+        ]
     proc = subprocess.Popen(cmd, stdout=fh, stderr=subprocess.STDOUT)
     st.session_state.uvicorn_proc = proc
     st.session_state.uvicorn_log = str(logfile)
+    backend_health.clear()
     return proc, logfile, fh
 
 def stop_backend():
@@ -63,18 +123,46 @@ def stop_backend():
         proc.kill()
     st.session_state.uvicorn_proc = None
     st.session_state.uvicorn_log = None
+    backend_health.clear()
 
-def wait_for_backend(timeout=30, delay=1.0):
+def wait_for_backend(timeout=120, delay=1.0):
+    # the server answers before the model is loaded; wait until it is ready
     for _ in range(timeout):
         try:
-            r = requests.get(HEALTH_URL, timeout=1.0)
+            r = http_session().get(READY_URL, timeout=1.0)
             if r.status_code == 200:
+                backend_health.clear()
                 return True
-        except Exception:
+        except requests.RequestException:
             pass
         time.sleep(delay)
     return False
 
+def predict_one(uploaded):
+    name, data, mime = prepare_upload(uploaded.name, uploaded.getvalue())
+    r = http_session().post(API_URL, files={"file": (name, data, mime or uploaded.type)}, timeout=REQUEST_TIMEOUT)
+    if r.status_code != 200:
+        raise RuntimeError(f"Backend error: {r.status_code} {r.text}")
+    return r.json()
+
+def predict_many(uploads, progress):
+    """Send the files through /predict/batch in chunks, updating `progress`."""
+    results = []
+    for start in range(0, len(uploads), BATCH_CHUNK):
+        chunk = uploads[start:start + BATCH_CHUNK]
+        files = []
+        for up in chunk:
+            name, data, mime = prepare_upload(up.name, up.getvalue())
+            files.append(("files", (name, data, mime or up.type)))
+        r = http_session().post(BATCH_URL, files=files, timeout=REQUEST_TIMEOUT)
+        if r.status_code != 200:
+            raise RuntimeError(f"Backend error: {r.status_code} {r.text}")
+        for up, res in zip(chunk, r.json()["results"]):
+            results.append(dict(res, filename=up.name))
+        done = start + len(chunk)
+        progress.progress(done / len(uploads), text=f"Analyzed {done} of {len(uploads)} images")
+    return results
+
 def tail_log(path, max_bytes=4000):
     p = Path(path)
     if not p.exists():
@@ -106,13 +194,8 @@ with st.sidebar:
     st.caption("Advanced Settings")
     col1, col2 = st.columns(2)
 
-    backend_running = False
-    # quick health probe
-    try:
-        r = requests.get(HEALTH_URL, timeout=0.8)
-        backend_running = (r.status_code == 200)
-    except Exception:
-        backend_running = False
+    # cached for HEALTH_TTL_S, so reruns do not each probe the backend
+    backend_running = backend_health()
 
     with col1:
         if not backend_running and st.session_state.uvicorn_proc is None:
@@ -138,11 +221,7 @@ with st.sidebar:
 
 # --- auto-start backend if not up ---
 # Only try auto-start when there's no tracked uvicorn process and the health probe failed.
-try:
-    r = requests.get(HEALTH_URL, timeout=0.8)
-    backend_up = (r.status_code == 200)
-except Exception:
-    backend_up = False
+backend_up = backend_health()
 
 if not backend_up and st.session_state.uvicorn_proc is None:
     with st.spinner("Auto-starting backend..."):
@@ -154,35 +233,39 @@ if not backend_up and st.session_state.uvicorn_proc is None:
 
 # --- file upload and analyze UI ---
 st.markdown('<p style="font-size:1.05rem;color:#0d7377;font-weight:600;margin-top:0.8rem">Select an image of a leaf</p>', unsafe_allow_html=True)
-uploaded = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"], help="Drag & drop • Limit 200MB", label_visibility="collapsed")
+uploads = st.file_uploader("Choose images...", type=["jpg", "jpeg", "png"], accept_multiple_files=True,
+                           help="Drag & drop one or more images • resized to the model's scale before upload",
+                           label_visibility="collapsed")
 
-if uploaded:
+if len(uploads) == 1:
+    uploaded = uploads[0]
     c1, c2 = st.columns([1, 1])
     with c1:
         st.image(uploaded, use_container_width=True)
         st.markdown('<p style="text-align:left;color:#666;margin-top:0.4rem">Uploaded Leaf for Diagnosis</p>', unsafe_allow_html=True)
 
-    # re-check backend before analyze
-    try:
-        r = requests.get(HEALTH_URL, timeout=0.8)
-        backend_up = (r.status_code == 200)
-    except Exception:
-        backend_up = False
-
-    if backend_up:
+    if backend_health():
         if st.button("Analyze Disease"):
-            files = {"file": (uploaded.name, uploaded.getvalue(), uploaded.type)}
             with st.spinner("Analyzing..."):
                 try:
-                    r = requests.post(API_URL, files=files, timeout=60)
-                    if r.status_code == 200:
-                        st.session_state.prediction_result = r.json()
-                    else:
-                        st.error(f"Backend error: {r.status_code} {r.text}")
+                    st.session_state.prediction_result = predict_one(uploaded)
+                    st.session_state.batch_results = None
                 except Exception as e:
                     st.error(f"Request failed: {e}")
     else:
         st.warning("⚠️ Backend is not running. Start it from the Backend Control section.")
+elif uploads:
+    st.caption(f"{len(uploads)} images selected")
+    if backend_health():
+        if st.button(f"Analyze {len(uploads)} Images"):
+            progress = st.progress(0.0, text=f"Analyzing {len(uploads)} images...")
+            try:
+                st.session_state.batch_results = predict_many(uploads, progress)
+                st.session_state.prediction_result = None
+            except Exception as e:
+                st.error(f"Request failed: {e}")
+    else:
+        st.warning("⚠️ Backend is not running. Start it from the Backend Control section.")
 
 # --- display prediction result ---
 res = st.session_state.prediction_result
@@ -206,5 +289,15 @@ if res:
         render_tiles("Causes", res.get("causes", []))
         render_tiles("Treatment Suggestions", res.get("suggestions", []))
 
+batch = st.session_state.batch_results
+if batch:
+    st.markdown('<div class="section-header">Diagnosis Results</div>', unsafe_allow_html=True)
+    st.dataframe(
+        [{"File": r["filename"], "Prediction": r.get("label", "—"), "Confidence": r.get("confidence"),
+          "Error": r.get("error", "")} for r in batch],
+        use_container_width=True,
+        hide_index=True,
+    )
+
 st.markdown("---")
 st.caption("💡 Tip: Log files are stored in the /logs folder for troubleshooting.")
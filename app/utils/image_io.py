@@ -0,0 +1,73 @@
+import io
+import mmap
+import os
+
+from PIL import Image, ImageOps
+
+# reject anything larger before a single pixel is decoded (~100 MP by default)
+MAX_IMAGE_PIXELS = int(os.getenv("CROP_MAX_IMAGE_PIXELS", str(100_000_000)))
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an image's declared dimensions exceed MAX_IMAGE_PIXELS."""
+
+
+class _BufferReader(io.RawIOBase):
+    # seekable read-only file over a buffer (e.g. an mmap), without copying it
+    def __init__(self, buf):
+        self._view = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+def as_file(data):
+    """A binary file object over encoded image data: bytes, a buffer, or already a file."""
+    if isinstance(data, (bytes, bytearray)):
+        return io.BytesIO(data)  # shares `bytes`, no copy
+    if isinstance(data, (memoryview, mmap.mmap)):
+        return io.BufferedReader(_BufferReader(data))
+    return data
+
+
+def decode_image(data, target_size=None, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Decode encoded image bytes (a buffer such as an mmap, or a binary file
+    object) to an RGB PIL image.
+
+    Only the header is parsed before the pixel-count check, so oversized
+    inputs are rejected cheaply. For JPEGs, when `target_size` is given the
+    decoder is put in draft mode and scales down in the DCT domain (by 1/2,
+    1/4 or 1/8) to the smallest size still >= target_size, which skips most
+    of the decode work for large phone photos. EXIF orientation is applied.
+    """
+    img = Image.open(as_file(data))
+    w, h = img.size
+    if w * h > max_pixels:
+        raise ImageTooLarge(f"Image is {w}x{h} pixels (limit {max_pixels})")
+    if target_size is not None and img.format == "JPEG":
+        img.draft("RGB", tuple(target_size))
+    img = ImageOps.exif_transpose(img)
+    return img.convert("RGB")
@@ -1,14 +1,103 @@
-import tensorflow as tf
 import numpy as np
-from tensorflow.keras.applications.efficientnet import preprocess_input
 
 IMG_SIZE = (224, 224)
 
+def preprocess_input(x):
+    """
+    NumPy version of keras' efficientnet.preprocess_input. For EfficientNet
+    that is a pass-through, because the model rescales its input itself, so
+    this module does not need TensorFlow.
+    """
+    return x
+
+def img_to_array(image):
+    """PIL image -> float32 (H,W,C) array, like keras' img_to_array."""
+    x = np.asarray(image, dtype=np.float32)
+    return x[..., None] if x.ndim == 2 else x
+
 def preprocess_image(image):
     image = image.resize(IMG_SIZE)
-    image = tf.keras.preprocessing.image.img_to_array(image)
+    image = img_to_array(image)
     image = np.expand_dims(image, axis=0)
     image = preprocess_input(image)   # ✅ EfficientNet preprocessing
     return image
 
-print("Preprocessing module loaded.")
\ No newline at end of file
+def resize_image(image):
+    """Resize a PIL image to the model input size as an (H,W,3) uint8 array."""
+    return np.asarray(image.resize(IMG_SIZE), dtype=np.uint8)
+
+
+class BatchBuffer:
+    """
+    Reusable (capacity,H,W,3) model input buffer.
+
+    `fill` copies resized images into the leading rows and returns a view of
+    them, so steady-state batches allocate nothing beyond the per-image
+    resize. With dtype=np.float32, EfficientNet normalization runs once over
+    the whole batch. With dtype=np.uint8, pixels stay raw and the cast to
+    float is left to the model graph, which quarters the bytes copied.
+    The returned view is overwritten by the next `fill`.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.array = np.empty((max(1, int(capacity)), IMG_SIZE[1], IMG_SIZE[0], 3), dtype=self.dtype)
+
+    @property
+    def capacity(self):
+        return self.array.shape[0]
+
+    def fill(self, images):
+        """Copy PIL images or (H,W,3) arrays into the buffer; returns the batch view."""
+        n = len(images)
+        if n > self.capacity:
+            self.array = np.empty((n,) + self.array.shape[1:], dtype=self.dtype)
+        batch = self.array[:n]
+        for i, image in enumerate(images):
+            if not isinstance(image, np.ndarray):
+                image = resize_image(image)
+            batch[i] = image  # casts uint8 -> buffer dtype in place
+        if self.dtype == np.uint8:
+            return batch
+        return preprocess_input(batch)
+
+
+def tile_grid(width, height, tile=IMG_SIZE[0], overlap=0.25, max_tiles=64):
+    """
+    Plan a grid of `tile`-pixel squares overlapping by `overlap` (a fraction
+    of the tile) over a `width` x `height` image. Returns
+    (cols, rows, stride, out_width, out_height): the image is resized to
+    out_width x out_height so the tiles cover it exactly. When the grid at
+    full resolution would need more than `max_tiles` tiles, the image is
+    scaled down until it fits.
+    """
+    stride = max(1, int(round(tile * (1.0 - overlap))))
+    max_tiles = max(1, int(max_tiles))
+    scale = 1.0
+    while True:
+        w, h = max(tile, width * scale), max(tile, height * scale)
+        cols = int(np.ceil((w - tile) / stride)) + 1
+        rows = int(np.ceil((h - tile) / stride)) + 1
+        if cols * rows <= max_tiles:
+            break
+        scale *= np.sqrt(max_tiles / (cols * rows)) * 0.98
+    return cols, rows, stride, tile + stride * (cols - 1), tile + stride * (rows - 1)
+
+
+def extract_tiles(image, stride, tile=IMG_SIZE[0]):
+    """
+    (rows, cols, tile, tile, 3) read-only strided view of the tiles of an
+    (H,W,3) array whose size comes from `tile_grid`. No pixels are copied.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(image, (tile, tile, 3))
+    return windows[::stride, ::stride, 0]
+
+
+def preprocess_batch(images, out=None, dtype=np.float32):
+    """
+    Preprocess a list of PIL images (or resized uint8 arrays) into one
+    (N,H,W,3) batch, reusing `out` (a BatchBuffer) when given.
+    """
+    if out is None:
+        out = BatchBuffer(len(images), dtype=dtype)
+    return out.fill(images)
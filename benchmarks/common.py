@@ -0,0 +1,97 @@
+# benchmarks/common.py
+"""Helpers shared by the benchmarks: synthetic inputs, timing summaries, run metadata."""
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+
+def synthetic_jpeg(megapixels, seed=0, quality=90):
+    """A photo-like JPEG: smooth gradients plus mild noise, 4:3 aspect."""
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    rs = np.random.RandomState(seed)
+    small = rs.randint(0, 255, (h // 64 + 1, w // 64 + 1, 3), dtype=np.uint8)
+    img = Image.fromarray(small).resize((w, h), Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size in MiB of this process (or `pid`, Linux only)."""
+    # VmHWM resets on exec; ru_maxrss is inherited from the parent on Linux
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        if pid is not None:
+            return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def summarize(times_ms):
+    """Latency summary of a list of durations in milliseconds."""
+    t = np.asarray(times_ms, dtype=np.float64)
+    if not len(t):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(t, [50, 95, 99])
+    return {
+        "count": int(len(t)),
+        "mean_ms": round(float(t.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "min_ms": round(float(t.min()), 3),
+        "max_ms": round(float(t.max()), 3),
+    }
+
+
+def time_calls(fn, repeat, warmup=2):
+    """Call `fn` `warmup` + `repeat` times; returns the timed durations in ms."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return times
+
+
+def run_metadata(**extra):
+    """What a result was measured on, so runs can be compared across commits."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return dict({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }, **extra)
+
+
+def write_results(results, out=None):
+    """Print `results` as JSON and also write them to `out` when given."""
+    text = json.dumps(results, indent=2)
+    if out:
+        Path(out).parent.mkdir(parents=True, exist_ok=True)
+        Path(out).write_text(text + "\n")
+    print(text)
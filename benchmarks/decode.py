@@ -0,0 +1,94 @@
+# benchmarks/decode.py
+"""
+Compare the original full-resolution decode with the draft-mode decode path.
+
+    python -m benchmarks.decode --megapixels 12 48 --repeat 10
+
+Test images are generated once, written to a temp dir, and each
+(path, size) pair is timed in a fresh subprocess so peak RSS reflects only
+that decode path. Results are printed as JSON.
+"""
+import argparse
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.common import peak_rss_mb, synthetic_jpeg
+
+IMG_SIZE = (224, 224)
+
+
+def decode_full(data):
+    # the original path: full decode, then squash to the model input size
+    return Image.open(io.BytesIO(data)).convert("RGB").resize(IMG_SIZE)
+
+
+def decode_draft(data):
+    from app.utils.image_io import decode_image
+    return decode_image(data, target_size=IMG_SIZE).resize(IMG_SIZE)
+
+
+PATHS = {"full": decode_full, "draft": decode_draft}
+
+
+def run_worker(path, image_file, repeat):
+    data = Path(image_file).read_bytes()
+    fn = PATHS[path]
+    rss_before = peak_rss_mb()
+    fn(data)  # warm up imports and codec tables
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return {
+        "path": path,
+        "bytes": len(data),
+        "median_ms": round(statistics.median(times), 2),
+        "min_ms": round(min(times), 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_before_mb": round(rss_before, 1),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--megapixels", type=float, nargs="+", default=[12, 48])
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--out", help="also write results to this JSON file")
+    ap.add_argument("--worker", nargs=2, metavar=("PATH", "FILE"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker[0], args.worker[1], args.repeat)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mp in args.megapixels:
+            image_file = Path(tmp) / f"synthetic_{mp:g}mp.jpg"
+            image_file.write_bytes(synthetic_jpeg(mp))
+            for path in PATHS:
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.decode", "--worker", path, str(image_file),
+                     "--repeat", str(args.repeat)],
+                    check=True, capture_output=True, text=True,
+                )
+                result = dict(json.loads(out.stdout.strip().splitlines()[-1]), megapixels=mp)
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(results, fh, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/load.py
+"""
+End-to-end HTTP load test of /predict.
+
+    python -m benchmarks.load --model model/PlantRecogModelv1.keras --concurrency 1 8 32 --out results/load.json
+    python -m benchmarks.load --url http://127.0.0.1:8000     # an already running server
+
+Without --url a local server is started: uvicorn for --workers 1, otherwise
+`python -m app.serve`. It runs with the prediction cache off unless --cache
+is given, and the test waits for /readyz before sending anything. Each
+--concurrency level runs for --duration seconds. Clients keep connections
+alive and cycle through --images distinct synthetic JPEGs. Every level
+reports p50/p95/p99 latency, throughput, status counts and the server's
+peak RSS, summed over its processes.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from benchmarks.common import PROJECT_ROOT, peak_rss_mb, run_metadata, summarize, synthetic_jpeg, write_results
+
+
+def _process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as fh:
+            for child in fh.read().split():
+                pids.extend(_process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def server_rss_mb(pid):
+    if pid is None:
+        return None
+    rss = [peak_rss_mb(p) for p in _process_tree(pid)]
+    rss = [r for r in rss if r is not None]
+    return round(sum(rss), 1) if rss else None
+
+
+def start_server(port, workers, model, cache, log_path):
+    env = dict(os.environ)
+    if model:
+        env["CROP_MODEL_PATH"] = model
+    if not cache:
+        env["CROP_CACHE_ENABLED"] = "0"
+    if workers > 1:
+        cmd = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app.api.routes:app", "--port", str(port)]
+    log = open(log_path, "ab")
+    return subprocess.Popen(cmd + ["--log-level", "warning"], cwd=PROJECT_ROOT, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url + "/readyz", timeout=1.0).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_level(url, images, concurrency, duration):
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(offset):
+        session = requests.Session()
+        i = offset
+        while time.perf_counter() < stop_at:
+            data = images[i % len(images)]
+            i += concurrency
+            t0 = time.perf_counter()
+            try:
+                status = session.post(url + "/predict", files={"file": ("leaf.jpg", data, "image/jpeg")},
+                                      timeout=60).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            ms = (time.perf_counter() - t0) * 1000.0
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(ms)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": sum(statuses.values()),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "status": {str(k): v for k, v in statuses.items()},
+        "latency": summarize(latencies),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="benchmark this server instead of starting one")
+    ap.add_argument("--model", help="model file for the local server (CROP_MODEL_PATH)")
+    ap.add_argument("--workers", type=int, default=1, help="HTTP workers of the local server")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--cache", action="store_true", help="keep the prediction cache on")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    ap.add_argument("--warmup", type=float, default=3.0, help="seconds of load before measuring")
+    ap.add_argument("--images", type=int, default=32, help="distinct synthetic images")
+    ap.add_argument("--megapixels", type=float, default=2.0)
+    ap.add_argument("--ready-timeout", type=float, default=300.0)
+    ap.add_argument("--out", help="also write results to this JSON file")
+    args = ap.parse_args(argv)
+
+    images = [synthetic_jpeg(args.megapixels, seed=i) for i in range(args.images)]
+    proc = None
+    url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    if not args.url:
+        log_path = PROJECT_ROOT / "logs" / "benchmark_server.log"
+        log_path.parent.mkdir(exist_ok=True)
+        proc = start_server(args.port, args.workers, args.model, args.cache, log_path)
+    try:
+        if not wait_ready(url, args.ready_timeout):
+            raise SystemExit(f"{url} did not become ready; see logs/benchmark_server.log")
+        model = requests.get(url + "/readyz", timeout=5).json().get("model_version")
+        if args.warmup > 0:
+            run_level(url, images, max(args.concurrency), args.warmup)
+        levels = []
+        for c in args.concurrency:
+            level = run_level(url, images, c, args.duration)
+            level["server_peak_rss_mb"] = server_rss_mb(proc.pid if proc else None)
+            levels.append(level)
+            lat = level["latency"]
+            print(f"c={c:<4} {level['throughput_rps']:>8.1f} req/s  p50 {lat.get('p50_ms')} "
+                  f"p95 {lat.get('p95_ms')} p99 {lat.get('p99_ms')} ms  {level['status']}", file=sys.stderr)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    write_results({
+        "benchmark": "load",
+        "meta": run_metadata(url=url, model_version=model, workers=None if args.url else args.workers,
+                             cache=args.cache, megapixels=args.megapixels, images=args.images),
+        "levels": levels,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
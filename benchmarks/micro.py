@@ -0,0 +1,85 @@
+# benchmarks/micro.py
+"""
+Time each stage of the inference path in-process.
+
+    python -m benchmarks.micro --model model/PlantRecogModelv1.keras --out results/micro.json
+
+Stages: decode (full and draft), the original `preprocess_image`, the
+serving resize, `model.predict` on the original float input, the compiled
+serving runtime at each --batch-sizes, `postprocess`, and
+`predict_from_bytes` end to end (prediction cache and near-duplicate
+reuse disabled). Inputs are synthetic JPEGs, so no dataset is needed.
+Each stage reports mean/p50/p95/p99 in ms; the run metadata (commit, model
+version, runtime) makes result files comparable across commits.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from benchmarks.common import peak_rss_mb, run_metadata, summarize, synthetic_jpeg, time_calls, write_results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--model", help="model file to load (defaults to CROP_MODEL_PATH / the registry)")
+    ap.add_argument("--megapixels", type=float, default=12)
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    ap.add_argument("--out", help="also write results to this JSON file")
+    args = ap.parse_args(argv)
+
+    # measure the model, not the caches in front of it
+    os.environ["CROP_CACHE_ENABLED"] = "0"
+    os.environ["CROP_PHASH_ENABLED"] = "0"
+    if args.model:
+        os.environ["CROP_MODEL_PATH"] = args.model
+
+    from app.api import inference
+    from app.utils.image_io import decode_image
+    from app.utils.preprocessing import IMG_SIZE, preprocess_image, resize_image
+
+    inference.wait_until_ready()
+    m = inference.acquire_model()
+    keras_model = getattr(m.runtime, "serving", None)
+    keras_model = keras_model.model if keras_model is not None else None
+
+    data = synthetic_jpeg(args.megapixels)
+    img = decode_image(data, target_size=IMG_SIZE)
+    inp = resize_image(img)
+    stages = {}
+
+    def bench(name, fn, repeat=args.repeat):
+        stages[name] = summarize(time_calls(fn, repeat))
+        print(f"{name:<28} p50 {stages[name]['p50_ms']:>9.3f} ms", file=sys.stderr)
+
+    bench("decode_full", lambda: decode_image(data))
+    bench("decode_draft", lambda: decode_image(data, target_size=IMG_SIZE))
+    bench("preprocess_image", lambda: preprocess_image(img))
+    bench("resize_image", lambda: resize_image(img))
+    for n in args.batch_sizes:
+        batch = np.repeat(inp[None], n, axis=0)
+        if keras_model is not None:
+            floats = np.repeat(preprocess_image(img), n, axis=0)
+            bench(f"model_predict[b={n}]", lambda: keras_model.predict(floats, verbose=0),
+                  repeat=max(3, args.repeat // 3))
+        bench(f"serving_runtime[b={n}]", lambda: m(batch))
+    preds = m(inp[None])
+    row = tuple(p[0] for p in preds)
+    bench("postprocess", lambda: inference.postprocess(row, m))
+    bench("predict_from_bytes", lambda: inference.predict_from_bytes(data))
+    inference.release_model(m)
+
+    results = {
+        "benchmark": "micro",
+        "meta": run_metadata(model_version=m.version, runtime=m.runtime.kind,
+                             megapixels=args.megapixels, image_bytes=len(data)),
+        "stages": stages,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    write_results(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
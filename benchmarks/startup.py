@@ -0,0 +1,128 @@
+# benchmarks/startup.py
+"""
+Measure cold-start cost: import time of the app's modules and, with
+--model, how long a fresh server takes to answer /livez and /readyz.
+
+    python -m benchmarks.startup --repeat 5 --model model/PlantRecogModelv1.keras --out results/startup.json
+    python -m benchmarks.startup --check-preprocessing
+
+Each import is timed in a fresh interpreter. The report also says whether
+TensorFlow ended up loaded. --check-preprocessing compares the NumPy
+`preprocess_image` with the Keras img_to_array + efficientnet
+preprocess_input pipeline it replaced, and exits non-zero on any difference.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import requests
+from PIL import Image
+
+from benchmarks.common import PROJECT_ROOT, run_metadata, write_results
+from benchmarks.load import start_server
+
+MODULES = ("app.utils.preprocessing", "app.utils.image_io", "app.api.inference", "app.api.routes",
+           "app.batch", "tensorflow")
+
+_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import {module}
+print(time.perf_counter() - t0, "tensorflow" in sys.modules)
+"""
+
+
+def time_import(module, repeat):
+    times, loads_tf = [], None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)], cwd=PROJECT_ROOT,
+                             capture_output=True, text=True, check=True)
+        seconds, tf_loaded = out.stdout.strip().splitlines()[-1].split()
+        times.append(float(seconds) * 1000.0)
+        loads_tf = tf_loaded == "True"
+    return {"median_ms": round(statistics.median(times), 1), "min_ms": round(min(times), 1),
+            "loads_tensorflow": loads_tf}
+
+
+def time_server_start(port, model):
+    t0 = time.perf_counter()
+    log = PROJECT_ROOT / "logs" / "benchmark_server.log"
+    log.parent.mkdir(exist_ok=True)
+    proc = start_server(port, 1, model, cache=False, log_path=log)
+    url = f"http://127.0.0.1:{port}"
+    marks = {}
+    try:
+        while "ready_s" not in marks and time.perf_counter() - t0 < 300:
+            for name, path in (("live_s", "/livez"), ("ready_s", "/readyz")):
+                if name in marks:
+                    continue
+                try:
+                    if requests.get(url + path, timeout=1.0).status_code == 200:
+                        marks[name] = round(time.perf_counter() - t0, 2)
+                except requests.RequestException:
+                    pass
+            time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(30)
+    return marks
+
+
+def check_preprocessing(samples=20):
+    """Max abs difference between the NumPy and the Keras preprocessing."""
+    import tensorflow as tf
+    from tensorflow.keras.applications.efficientnet import preprocess_input
+
+    from app.utils.preprocessing import preprocess_image
+
+    def keras_preprocess(image):
+        x = tf.keras.preprocessing.image.img_to_array(image.resize((224, 224)))
+        return preprocess_input(np.expand_dims(x, axis=0))
+
+    rs = np.random.RandomState(0)
+    worst = 0.0
+    for i in range(samples):
+        h, w = rs.randint(50, 1200, size=2)
+        image = Image.fromarray(rs.randint(0, 256, (h, w, 3), dtype=np.uint8))
+        for img in (image, image.convert("L")):
+            ours, ref = preprocess_image(img), keras_preprocess(img)
+            if ours.shape != ref.shape or ours.dtype != ref.dtype:
+                raise SystemExit(f"shape/dtype mismatch: {ours.shape} {ours.dtype} vs {ref.shape} {ref.dtype}")
+            worst = max(worst, float(np.max(np.abs(ours - ref))))
+    return worst
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--modules", nargs="+", default=list(MODULES))
+    ap.add_argument("--model", help="also time a server start with this model")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--check-preprocessing", action="store_true")
+    ap.add_argument("--out", help="also write results to this JSON file")
+    args = ap.parse_args(argv)
+
+    if args.check_preprocessing:
+        diff = check_preprocessing()
+        print(json.dumps({"preprocess_image_max_abs_diff": diff}))
+        if diff != 0.0:
+            raise SystemExit(1)
+        return
+
+    imports = {}
+    for module in args.modules:
+        imports[module] = time_import(module, args.repeat)
+        print(f"{module:<28} {imports[module]['median_ms']:>8.1f} ms  tensorflow={imports[module]['loads_tensorflow']}",
+              file=sys.stderr)
+    results = {"benchmark": "startup", "meta": run_metadata(), "imports": imports}
+    if args.model:
+        results["server"] = time_server_start(args.port, args.model)
+    write_results(results, args.out)
+
+
+if __name__ == "__main__":
+    main()
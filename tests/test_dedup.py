@@ -0,0 +1,114 @@
+import io
+import random
+
+import numpy as np
+from PIL import Image
+
+from app.api.dedup import BKTree, NearDuplicateIndex, dhash, hamming
+
+
+def _leaf(seed, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    # smooth noise, so the hash reflects structure rather than pixel noise
+    small = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.BICUBIC)
+
+
+def _reencode(img, quality=60, scale=0.5):
+    img = img.resize((int(img.width * scale), int(img.height * scale)), Image.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+def test_hamming():
+    assert hamming(0, 0) == 0
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(0, (1 << 64) - 1) == 64
+
+
+def test_bktree_matches_brute_force():
+    rnd = random.Random(0)
+    hashes = [rnd.getrandbits(64) for _ in range(500)]
+    # a few close neighbours so some queries hit
+    hashes += [h ^ (1 << rnd.randrange(64)) for h in hashes[:50]]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+    for _ in range(200):
+        q = rnd.choice(hashes) ^ rnd.getrandbits(64) & rnd.getrandbits(64) & rnd.getrandbits(64)
+        for threshold in (0, 3, 6, 12):
+            found = tree.nearest(q, threshold)
+            best = min(hamming(q, h) for h in hashes)
+            if best > threshold:
+                assert found is None
+            else:
+                assert found is not None and found[0] == best
+                assert hamming(q, hashes[found[1]]) == best
+
+
+def test_bktree_threshold_is_inclusive():
+    tree = BKTree()
+    tree.add(0, "a")
+    assert tree.nearest(0b111, 3) == (3, "a")
+    assert tree.nearest(0b1111, 3) is None
+    assert BKTree().nearest(0, 64) is None
+
+
+def test_bktree_same_hash_replaces_value():
+    tree = BKTree()
+    tree.add(42, "old")
+    tree.add(42, "new")
+    assert tree.size == 1
+    assert tree.nearest(42, 0) == (0, "new")
+
+
+def test_dhash_survives_reencoding_but_separates_images():
+    a, b = _leaf(1), _leaf(2)
+    assert hamming(dhash(a), dhash(_reencode(a))) <= 6
+    assert hamming(dhash(a), dhash(b)) > 6
+
+
+def test_index_lookup_is_scoped_to_model_version():
+    index = NearDuplicateIndex(threshold=4, max_entries=100, audit_rate=0)
+    index.add(0b1010, "v1", {"label": "x"})
+    assert index.lookup(0b1011, "v1") == (1, {"label": "x"})
+    assert index.lookup(0b1010, "v2") is None
+    index.add(0b1010, "v2", {"label": "y"})
+    assert index.lookup(0b1010, "v1") is None
+    assert index.stats()["entries"] == 1
+
+
+def test_index_keeps_variants_apart():
+    # a crop hint is a variant of the same model version; it must neither
+    # match nor wipe the unhinted entries
+    index = NearDuplicateIndex(threshold=4, max_entries=100, audit_rate=0)
+    index.add(0b1010, "v1", {"label": "plain"})
+    index.add(0b1010, "v1", {"label": "tomato"}, variant="v1#Tomato")
+    assert index.lookup(0b1010, "v1") == (0, {"label": "plain"})
+    assert index.lookup(0b1010, "v1", "v1#Tomato") == (0, {"label": "tomato"})
+    assert index.lookup(0b1010, "v1", "v1#Apple") is None
+    assert index.stats()["variants"] == 2
+    index.add(0b1010, "v2", {"label": "new"})
+    assert index.lookup(0b1010, "v2", "v1#Tomato") is None
+
+
+def test_index_compaction_keeps_newest_entries():
+    index = NearDuplicateIndex(threshold=0, max_entries=4, audit_rate=0)
+    for i in range(5):
+        index.add(i << 10, "v1", {"i": i})
+    assert index.stats()["entries"] == 3
+    assert index.lookup(0, "v1") is None
+    assert index.lookup(4 << 10, "v1") == (0, {"i": 4})
+
+
+def test_audits_count_false_reuse_by_distance():
+    index = NearDuplicateIndex(threshold=6, audit_rate=1.0)
+    assert index.should_audit()
+    index.record_audit(2, {"label": "a"}, {"label": "a"})
+    index.record_audit(5, {"label": "a"}, {"label": "b"})
+    stats = index.stats()
+    assert stats["audits"] == 2
+    assert stats["false_reuse"] == 1
+    assert stats["false_reuse_rate"] == 0.5
+    assert stats["false_reuse_distances"][5] == 1
@@ -0,0 +1,150 @@
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api import inference
+from app.api.hierarchy import CropHierarchy, UnknownCrop
+from app.api.routes import app
+from app.utils.labels import CLASS_NAMES
+
+NAMES = ["Apple___scab", "Apple___healthy", "Tomato___Early_blight", "Tomato___Late_blight",
+         "Tomato___healthy", "Corn_(maize)___Common_rust_", "Corn_(maize)___healthy"]
+
+
+def _row(probs):
+    """Top-k row (values, indices) for a full probability vector, best first."""
+    probs = np.asarray(probs, dtype=np.float32)
+    order = np.argsort(-probs)
+    return probs[order], order
+
+
+def test_crops_and_aliases():
+    h = CropHierarchy(NAMES)
+    assert h.crops == ["Apple", "Tomato", "Corn_(maize)"]
+    assert h.resolve("tomato") == "Tomato"
+    assert h.resolve(" Corn ") == "Corn_(maize)"
+    assert h.resolve("corn_(maize)") == "Corn_(maize)"
+    assert list(h.members("Tomato")) == [2, 3, 4]
+    with pytest.raises(UnknownCrop, match="expected one of: Apple, Tomato, Corn_\\(maize\\)"):
+        h.resolve("banana")
+
+
+def test_real_class_list_aliases():
+    h = CropHierarchy(CLASS_NAMES)
+    assert h.resolve("pepper") == "Pepper,_bell"
+    assert h.resolve("cherry") == "Cherry_(including_sour)"
+    assert h.resolve("corn") == "Corn_(maize)"
+
+
+def test_decide_picks_the_crop_with_most_mass():
+    # the single best class is an apple one, but tomato holds more mass
+    values, indices = _row([0.30, 0.05, 0.25, 0.20, 0.15, 0.03, 0.02])
+    idx, confidence, crop, crop_mass = CropHierarchy(NAMES).decide(values, indices)
+    assert crop == "Tomato"
+    assert NAMES[idx] == "Tomato___Early_blight"
+    assert crop_mass == pytest.approx(0.60)
+    assert confidence == pytest.approx(0.25 / 0.60)
+
+
+def test_decide_with_hint_renormalizes_within_the_crop():
+    values, indices = _row([0.60, 0.20, 0.02, 0.08, 0.05, 0.03, 0.02])
+    idx, confidence, crop, crop_mass = CropHierarchy(NAMES).decide(values, indices, "Tomato")
+    assert (NAMES[idx], crop) == ("Tomato___Late_blight", "Tomato")
+    assert crop_mass == pytest.approx(0.15)
+    assert confidence == pytest.approx(0.08 / 0.15)
+
+
+def test_decide_counts_classes_outside_top_k_as_zero():
+    values, indices = _row([0.10, 0.05, 0.50, 0.20, 0.10, 0.03, 0.02])
+    idx, confidence, crop, _ = CropHierarchy(NAMES).decide(values[:2], indices[:2], "Apple")
+    # no apple class made the top 2
+    assert crop == "Apple" and confidence == 0.0
+
+
+def test_flat_names_match_argmax():
+    names = ["a", "b", "c"]
+    values, indices = _row([0.2, 0.7, 0.1])
+    idx, confidence, crop, crop_mass = CropHierarchy(names).decide(values, indices)
+    assert (idx, crop) == (1, "b")
+    assert confidence == pytest.approx(1.0)
+    assert crop_mass == pytest.approx(0.7)
+
+
+class _FixedRuntime:
+    """Answers every image with the same probability row."""
+
+    kind = "fixed"
+
+    def __init__(self, probs):
+        self.values, self.indices = _row(probs)
+        self.num_classes = len(probs)
+
+    def __call__(self, batch):
+        n = len(batch)
+        return np.tile(self.values, (n, 1)), np.tile(self.indices, (n, 1))
+
+
+@pytest.fixture
+def serve():
+    """Serve a fixed-answer model over CLASS_NAMES; returns (client, set_probs)."""
+    previous = inference._active
+
+    def set_probs(probs, version):
+        inference._swap(inference.LoadedModel(_FixedRuntime(probs), version, CLASS_NAMES))
+
+    # no `with`: the lifespan would start loading the real model
+    yield TestClient(app), set_probs
+    inference._swap(previous)
+    if previous is None:
+        inference._ready.clear()
+
+
+def _jpeg():
+    buf = io.BytesIO()
+    Image.fromarray(np.full((64, 64, 3), 90, dtype=np.uint8)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _probs(**by_class):
+    probs = np.full(len(CLASS_NAMES), 1e-4)
+    for name, p in by_class.items():
+        probs[CLASS_NAMES.index(name)] = p
+    return probs / probs.sum()
+
+
+def test_crop_hint_restricts_the_diagnosis(serve):
+    client, set_probs = serve
+    set_probs(_probs(Apple___Apple_scab=0.5, Tomato___Late_blight=0.4, Tomato___healthy=0.05), "fixed-1")
+    plain = client.post("/predict", files={"file": ("a.jpg", _jpeg())}).json()
+    hinted = client.post("/predict?crop=tomato", files={"file": ("a.jpg", _jpeg())})
+    assert plain["label"] == "Unrecognized"  # no crop holds THRESHOLD of the mass
+    assert hinted.status_code == 200
+    assert hinted.json()["label"] == "Tomato___Late_blight"
+
+
+def test_crop_hint_needs_some_mass_on_that_crop(serve):
+    client, set_probs = serve
+    set_probs(_probs(Apple___Apple_scab=0.9, Tomato___Late_blight=0.05), "fixed-2")
+    r = client.post("/predict?crop=tomato", files={"file": ("a.jpg", _jpeg())})
+    assert r.status_code == 200
+    assert r.json()["label"] == "Unrecognized"
+
+
+@pytest.mark.parametrize("route", ["/predict", "/predict/tiled"])
+def test_unknown_crop_is_a_400(serve, route):
+    client, set_probs = serve
+    set_probs(_probs(Tomato___Late_blight=0.9), "fixed-3")
+    r = client.post(f"{route}?crop=banana", files={"file": ("a.jpg", _jpeg())})
+    assert r.status_code == 400
+    assert "Unknown crop 'banana'" in r.json()["detail"]
+
+
+def test_unknown_crop_is_a_400_for_batches(serve):
+    client, set_probs = serve
+    set_probs(_probs(Tomato___Late_blight=0.9), "fixed-4")
+    r = client.post("/predict/batch?crop=banana", files=[("files", ("a.jpg", _jpeg()))])
+    assert r.status_code == 400
+    assert "expected one of" in r.json()["detail"]
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.utils.preprocessing import IMG_SIZE, BatchBuffer, preprocess_image, resize_image
+
+
+def test_matches_keras_preprocessing():
+    # the check behind `python -m benchmarks.startup --check-preprocessing`
+    pytest.importorskip("tensorflow")
+    from benchmarks.startup import check_preprocessing
+
+    assert check_preprocessing(samples=5) == 0.0
+
+
+def test_preprocess_image_shape_and_dtype():
+    img = Image.fromarray(np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8))
+    x = preprocess_image(img)
+    assert x.shape == (1, IMG_SIZE[1], IMG_SIZE[0], 3)
+    assert x.dtype == np.float32
+
+
+def test_serving_resize_is_the_same_pixels():
+    # the uint8 serving path and the float path see identical pixel values
+    img = Image.fromarray(np.random.default_rng(1).integers(0, 256, (300, 500, 3), dtype=np.uint8))
+    assert np.array_equal(resize_image(img).astype(np.float32), preprocess_image(img)[0])
+
+
+def test_batch_buffer_reuses_its_memory():
+    buf = BatchBuffer(4, dtype=np.uint8)
+    a = np.full((IMG_SIZE[1], IMG_SIZE[0], 3), 7, dtype=np.uint8)
+    first = buf.fill([a, a])
+    second = buf.fill([a, a, a])
+    assert first.shape[0] == 2 and second.shape[0] == 3
+    assert np.shares_memory(first, second)
+    assert (second == 7).all()
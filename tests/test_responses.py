@@ -0,0 +1,110 @@
+import gzip
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.api import inference, responses
+from app.api.responses import (
+    DiseaseIndex,
+    _entry_of,
+    compress,
+    debug_result,
+    disease_index,
+    dumps_json,
+    encode_batch,
+    encode_result,
+)
+from app.utils.labels import CLASS_NAMES
+
+
+def _reference(result):
+    # what the precompiled splice must be equivalent to
+    return json.loads(json.dumps(result, default=lambda o: o.tolist()))
+
+
+def _predicted(label, confidence=0.93):
+    m = SimpleNamespace(class_names=CLASS_NAMES, version="v1")
+    idx = CLASS_NAMES.index(label)
+    values = np.array([confidence, 1 - confidence], dtype=np.float32)
+    indices = np.array([idx, (idx + 1) % len(CLASS_NAMES)])
+    return inference.postprocess((values, indices), m)
+
+
+@pytest.mark.parametrize("label", ["Apple___Apple_scab", "Tomato___Late_blight", "Corn_(maize)___healthy"])
+def test_splice_matches_json_dumps(label):
+    result = _predicted(label)
+    # postprocess shares the compiled tuples, so the fast path is taken
+    assert _entry_of(result) is not None
+    assert json.loads(encode_result(result)) == _reference(result)
+
+
+def test_splice_for_unrecognized():
+    result = _predicted("Tomato___Late_blight", confidence=0.3)
+    assert result["label"] == "Unrecognized"
+    assert _entry_of(result) is disease_index.empty
+    assert json.loads(encode_result(result)) == _reference(result)
+
+
+def test_copied_lists_take_the_plain_path():
+    # e.g. a result read back from the SQLite cache
+    result = json.loads(json.dumps(_predicted("Apple___Black_rot"), default=list))
+    assert _entry_of(result) is None
+    assert json.loads(encode_result(result)) == _reference(result)
+
+
+def test_splice_with_only_info_fields():
+    entry = disease_index.get("Apple___Black_rot")
+    result = {"causes": entry.causes, "suggestions": entry.suggestions}
+    body = encode_result(result)
+    assert body.startswith(b"{") and body.endswith(b"}")
+    assert json.loads(body) == _reference(result)
+
+
+def test_splice_escapes_like_json():
+    index = DiseaseIndex({"Odd___label": {"causes": ['quote " and \\ and é', "line\nbreak"], "suggestions": []}})
+    entry = index.get("odd___label")
+    result = {"label": "Odd___label", "confidence": np.float32(0.5), "causes": entry.causes,
+              "suggestions": entry.suggestions, "extra": np.arange(3)}
+    spliced = b"{" + entry.json + b"," + dumps_json({k: v for k, v in result.items() if k not in ("causes", "suggestions")})[1:]
+    assert json.loads(spliced) == _reference(result)
+
+
+def test_batch_matches_json_dumps():
+    results = [_predicted("Apple___Apple_scab"), {"filename": "x.jpg", "error": "Could not decode image"},
+               _predicted("Potato___Early_blight", 0.2)]
+    assert json.loads(encode_batch(results)) == {"count": 3, "results": [_reference(r) for r in results]}
+    assert json.loads(encode_batch([])) == {"count": 0, "results": []}
+
+
+def test_debug_result_adds_matched_info():
+    result = debug_result(_predicted("Apple___Apple_scab"))
+    info = json.loads(encode_result(result))["_matched_info"]
+    assert info == disease_index.get("Apple___Apple_scab").as_dict()
+
+
+def test_compress_threshold_and_encoding(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    small = b"{}"
+    assert compress(small, "gzip") == (small, None)
+    body = encode_batch([_predicted("Apple___Apple_scab")] * 20)
+    packed, encoding = compress(body, "br;q=1.0, gzip")
+    assert encoding == "gzip"
+    assert gzip.decompress(packed) == body
+    assert compress(body, "identity") == (body, None)
+
+
+def test_msgpack_splice_matches_packb():
+    msgpack = pytest.importorskip("msgpack")
+    result = _predicted("Apple___Apple_scab")
+    body = encode_result(result, responses.MSGPACK)
+    assert msgpack.unpackb(body) == _reference(result)
+    batch = encode_batch([result, {"filename": "x.jpg", "error": "bad"}], responses.MSGPACK)
+    assert msgpack.unpackb(batch)["count"] == 2
+
+
+def test_negotiate_falls_back_to_json(monkeypatch):
+    monkeypatch.setattr(responses, "msgpack", None)
+    assert responses.negotiate("application/msgpack") == responses.JSON
+    assert responses.negotiate(None) == responses.JSON
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from app.utils.preprocessing import extract_tiles, tile_grid
+
+
+@pytest.mark.parametrize("width,height", [(224, 224), (225, 224), (1000, 600), (4000, 3000), (100, 50), (224, 5000)])
+@pytest.mark.parametrize("overlap", [0.0, 0.25, 0.5])
+def test_grid_covers_the_resized_image_exactly(width, height, overlap):
+    cols, rows, stride, tw, th = tile_grid(width, height, 224, overlap, max_tiles=64)
+    assert cols >= 1 and rows >= 1
+    assert cols * rows <= 64
+    # the last tile ends on the last pixel: no uncovered strip, no overhang
+    assert 224 + stride * (cols - 1) == tw
+    assert 224 + stride * (rows - 1) == th
+    assert stride == round(224 * (1 - overlap))
+
+
+def test_small_image_is_one_tile():
+    assert tile_grid(100, 50, 224) == (1, 1, 168, 224, 224)
+    assert tile_grid(224, 224, 224) == (1, 1, 168, 224, 224)
+
+
+def test_one_pixel_past_a_tile_adds_a_column():
+    cols, rows, _, tw, th = tile_grid(225, 224, 224, overlap=0.25)
+    assert (cols, rows) == (2, 1)
+    assert (tw, th) == (224 + 168, 224)
+
+
+def test_large_image_is_scaled_down_to_max_tiles():
+    for max_tiles in (1, 4, 16, 64):
+        cols, rows, _, tw, th = tile_grid(8000, 6000, 224, 0.25, max_tiles)
+        assert cols * rows <= max_tiles
+        # roughly keeps the aspect ratio
+        assert tw >= th
+    assert tile_grid(8000, 6000, 224, 0.25, max_tiles=0)[:2] == (1, 1)
+
+
+def test_extract_tiles_views_every_tile():
+    cols, rows, stride, tw, th = tile_grid(600, 400, 224, 0.25)
+    image = np.random.default_rng(0).integers(0, 256, (th, tw, 3), dtype=np.uint8)
+    tiles = extract_tiles(image, stride, 224)
+    assert tiles.shape == (rows, cols, 224, 224, 3)
+    assert np.shares_memory(tiles, image)
+    for r in range(rows):
+        for c in range(cols):
+            y, x = r * stride, c * stride
+            assert np.array_equal(tiles[r, c], image[y:y + 224, x:x + 224])
+    # corners: first and last tile touch the image edges
+    assert np.array_equal(tiles[0, 0, 0, 0], image[0, 0])
+    assert np.array_equal(tiles[-1, -1, -1, -1], image[-1, -1])
+
+
+def test_extract_tiles_is_read_only():
+    cols, rows, stride, tw, th = tile_grid(300, 300, 224, 0.5)
+    image = np.zeros((th, tw, 3), dtype=np.uint8)
+    tiles = extract_tiles(image, stride, 224)
+    with pytest.raises(ValueError):
+        tiles[0, 0, 0, 0, 0] = 1
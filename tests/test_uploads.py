@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import io
+import mmap
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.api.uploads import (
+    NotAnImage,
+    StreamedUpload,
+    UploadTooLarge,
+    expand_uploads,
+    receive_files,
+    receive_image,
+    sniff_image,
+)
+from app.utils.image_io import ImageTooLarge, decode_image
+
+
+def _image(fmt="JPEG", size=(64, 48)):
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(buf, fmt)
+    return buf.getvalue()
+
+
+def _feed(upload, data, chunk=1000):
+    for i in range(0, len(data), chunk):
+        upload.write(data[i:i + chunk])
+    upload.finish()
+    return upload
+
+
+class _Request:
+    """Just enough of a Starlette request for the upload readers."""
+
+    def __init__(self, body, content_type, chunk=4096):
+        self.headers = {"content-type": content_type, "content-length": str(len(body))}
+        self._body = body
+        self._chunk = chunk
+
+    async def stream(self):
+        for i in range(0, len(self._body), self._chunk):
+            yield self._body[i:i + self._chunk]
+
+
+def _multipart(parts, boundary="XyZ"):
+    body = b""
+    for name, filename, data in parts:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP", "BMP", "GIF", "TIFF"])
+def test_sniff_accepts_supported_formats(fmt):
+    assert sniff_image(_image(fmt)[:12])
+
+
+@pytest.mark.parametrize("head", [b"", b"%PDF-1.7\n", b"PK\x03\x04", b"<html><body>", b"RIFF\x00\x00\x00\x00WAVE"])
+def test_sniff_rejects_other_data(head):
+    assert not sniff_image(head)
+
+
+def test_non_image_is_rejected_on_the_first_chunk():
+    upload = StreamedUpload()
+    with pytest.raises(NotAnImage):
+        upload.write(b"%PDF-1.7\n" + b"x" * 100)
+
+
+def test_short_upload_is_checked_when_finished():
+    upload = StreamedUpload()
+    upload.write(b"GIF8")
+    with pytest.raises(NotAnImage):
+        upload.finish()
+
+
+def test_empty_upload():
+    with pytest.raises(ValueError, match="No file provided"):
+        StreamedUpload().finish()
+
+
+def test_oversized_body_stops_early():
+    upload = StreamedUpload(max_bytes=5000)
+    data = _image(size=(256, 256))
+    with pytest.raises(UploadTooLarge):
+        _feed(upload, data)
+    # nothing past the limit was taken in
+    assert upload.size <= 5000 + 1000
+
+
+def test_too_many_pixels_is_rejected_from_the_header():
+    # signature and IHDR only: the pixel data is never sent
+    head = _image("PNG", size=(200, 100))[:64]
+    upload = StreamedUpload(max_pixels=10_000)
+    with pytest.raises(ImageTooLarge, match="200x100"):
+        upload.write(head)
+
+
+def test_small_upload_stays_in_memory():
+    data = _image()
+    upload = _feed(StreamedUpload(spool_bytes=1 << 20), data)
+    payload = upload.payload()
+    assert isinstance(payload, memoryview)
+    assert bytes(payload) == data
+    upload.close()
+
+
+def test_large_upload_spills_to_an_mmap():
+    data = _image(size=(400, 300))
+    upload = _feed(StreamedUpload(spool_bytes=2048), data)
+    payload = upload.payload()
+    assert isinstance(payload, mmap.mmap)
+    assert payload[:] == data
+    assert upload.digest == hashlib.sha256(data).hexdigest()
+    # the decoder reads the mmap in place
+    assert decode_image(payload).size == (400, 300)
+    upload.close()
+
+
+def test_receive_image_from_multipart_and_raw_body():
+    data = _image()
+    body, content_type = _multipart([("other", "x.txt", b"ignored"), ("file", "leaf.jpg", data),
+                                     ("file", "second.jpg", b"not read")])
+    upload = asyncio.run(receive_image(_Request(body, content_type, chunk=97)))
+    assert upload.filename == "leaf.jpg"
+    assert bytes(upload.payload()) == data
+    upload.close()
+    raw = asyncio.run(receive_image(_Request(data, "image/jpeg")))
+    assert raw.size == len(data)
+    raw.close()
+
+
+def test_receive_image_rejects_by_content_length():
+    request = _Request(b"", "image/jpeg")
+    request.headers["content-length"] = str(10 << 20)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(receive_image(request, max_bytes=1 << 20))
+
+
+def test_receive_files_keeps_every_part_in_order():
+    first, second = _image("PNG"), _image(size=(300, 200))
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.jpg", first)
+        zf.writestr("notes.txt", b"skipped")
+    body, content_type = _multipart([("files", "one.png", first), ("files", "more.zip", archive.getvalue()),
+                                     ("files", "two.jpg", second)])
+    uploads = asyncio.run(receive_files(_Request(body, content_type)))
+    try:
+        assert [u.filename for u in uploads] == ["one.png", "more.zip", "two.jpg"]
+        images = expand_uploads([(u.filename, u.payload()) for u in uploads])
+        assert [name for name, _ in images] == ["one.png", "more.zip/a.jpg", "two.jpg"]
+        assert [bytes(data) for _, data in images] == [first, first, second]
+    finally:
+        for u in uploads:
+            u.close()
+
+
+def test_receive_files_limits():
+    body, content_type = _multipart([("files", f"{i}.jpg", b"x") for i in range(3)])
+    with pytest.raises(UploadTooLarge, match="Too many files"):
+        asyncio.run(receive_files(_Request(body, content_type), max_files=2))
+    body, content_type = _multipart([("files", "a.jpg", b"x" * 50_000)])
+    request = _Request(body, content_type)
+    del request.headers["content-length"]  # chunked: caught while streaming
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(receive_files(request, max_files=1, max_bytes=10_000))
+    with pytest.raises(ValueError, match="multipart"):
+        asyncio.run(receive_files(_Request(b"abc", "image/jpeg")))
+
+
+def test_expand_uploads_caps_the_expanded_batch():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.jpg", b"x" * 100)
+    with pytest.raises(UploadTooLarge, match="Too many images"):
+        expand_uploads([("a.zip", archive.getvalue())], max_files=2)
+    with pytest.raises(UploadTooLarge, match="Batch exceeds"):
+        expand_uploads([("a.zip", memoryview(archive.getvalue()))], max_bytes=250)